@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Photobooth - a flexible photo booth software
+# Copyright (C) 2023  <photobooth-lausanne at gmail dot com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Compact binary serialization of the messages passed between processes.
+
+Registered types (slotted classes and named tuples) are written as a small
+integer tag followed by their fields, instead of pickle's module and class
+names and attribute dictionaries. Anything else falls back to pickle.
+"""
+
+import pickle
+import struct
+
+_tag = struct.Struct('>H')
+_int = struct.Struct('>q')
+_float = struct.Struct('>d')
+_length = struct.Struct('>I')
+
+# Registered types by tag and tags and fields by type
+_types = {}
+_fields = {}
+
+
+def register(cls: type, tag: int):
+    """Register a slotted class or a named tuple under a fixed tag, which
+    has to be the same in all processes."""
+
+    if tag in _types and _types[tag] is not cls:
+        raise ValueError('Tag {} already used by {}'.format(tag, _types[tag]))
+
+    if hasattr(cls, '_fields'):
+        fields = None
+    else:
+        fields = tuple(slot for klass in reversed(cls.__mro__)
+                       for slot in klass.__dict__.get('__slots__', ()))
+
+    _types[tag] = cls
+    _fields[cls] = (tag, fields)
+
+
+def _encode(value: any, out: list):
+
+    kind = type(value)
+    if value is None:
+        out.append(b'N')
+    elif kind is bool:
+        out.append(b'T' if value else b'F')
+    elif kind is int and -2**63 <= value < 2**63:
+        out.append(b'i')
+        out.append(_int.pack(value))
+    elif kind is float:
+        out.append(b'd')
+        out.append(_float.pack(value))
+    elif kind is str:
+        data = value.encode()
+        out.append(b's')
+        out.append(_length.pack(len(data)))
+        out.append(data)
+    elif kind in _fields:
+        tag, fields = _fields[kind]
+        out.append(b'o')
+        out.append(_tag.pack(tag))
+        if fields is None:
+            for item in value:
+                _encode(item, out)
+        else:
+            for field in fields:
+                _encode(getattr(value, field), out)
+    elif kind is tuple:
+        out.append(b't')
+        out.append(_length.pack(len(value)))
+        for item in value:
+            _encode(item, out)
+    else:
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        out.append(b'p')
+        out.append(_length.pack(len(data)))
+        out.append(data)
+
+
+def _decode(data: memoryview, pos: int) -> tuple[any, int]:
+
+    kind = data[pos]
+    pos += 1
+    if kind == 78:  # N
+        return None, pos
+    elif kind == 84:  # T
+        return True, pos
+    elif kind == 70:  # F
+        return False, pos
+    elif kind == 105:  # i
+        return _int.unpack_from(data, pos)[0], pos + _int.size
+    elif kind == 100:  # d
+        return _float.unpack_from(data, pos)[0], pos + _float.size
+    elif kind == 115:  # s
+        length = _length.unpack_from(data, pos)[0]
+        pos += _length.size
+        return str(data[pos:pos + length], 'utf-8'), pos + length
+    elif kind == 111:  # o
+        cls = _types[_tag.unpack_from(data, pos)[0]]
+        pos += _tag.size
+        fields = _fields[cls][1]
+        if fields is None:
+            items = []
+            for _ in cls._fields:
+                item, pos = _decode(data, pos)
+                items.append(item)
+            return cls(*items), pos
+        value = cls.__new__(cls)
+        for field in fields:
+            item, pos = _decode(data, pos)
+            object.__setattr__(value, field, item)
+        return value, pos
+    elif kind == 116:  # t
+        count = _length.unpack_from(data, pos)[0]
+        pos += _length.size
+        items = []
+        for _ in range(count):
+            item, pos = _decode(data, pos)
+            items.append(item)
+        return tuple(items), pos
+    elif kind == 112:  # p
+        length = _length.unpack_from(data, pos)[0]
+        pos += _length.size
+        return pickle.loads(data[pos:pos + length]), pos + length
+
+    raise ValueError('Unknown type {} at {}'.format(chr(kind), pos - 1))
+
+
+def dumps(value: any) -> bytes:
+
+    out = []
+    _encode(value, out)
+    return b''.join(out)
+
+
+def loads(data: bytes) -> any:
+
+    return _decode(memoryview(data), 0)[0]
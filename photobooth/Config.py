@@ -59,6 +59,15 @@ class Config:
         with open(self._filename, 'w') as configfile:
             self._cfg.write(configfile)
 
+    def diff(self, other: 'Config') -> set[str]:
+
+        # Names of all sections with at least one differing value
+        sections = set(self._cfg.sections()) | set(other._cfg.sections())
+        return {section for section in sections
+                if not self._cfg.has_section(section)
+                or not other._cfg.has_section(section)
+                or dict(self._cfg[section]) != dict(other._cfg[section])}
+
     def get(self, section: str, key: str) -> str:
 
         return self._cfg[section][key]
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Photobooth - a flexible photo booth software
+# Copyright (C) 2023  <photobooth-lausanne at gmail dot com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import json
+import logging
+from collections import deque
+from threading import Lock
+from time import monotonic
+
+
+class Stage:
+
+    def __init__(self, metrics: 'Metrics', name: str):
+
+        self._metrics = metrics
+        self._name = name
+
+    def __enter__(self):
+
+        self._start = monotonic()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+
+        self._metrics.record(self._name, monotonic() - self._start)
+
+
+class NoStage:
+
+    def __enter__(self):
+
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+
+        pass
+
+
+class Metrics:
+    """
+    Rolling latency statistics of named stages, e.g.
+
+        with metrics.stage('picture.transfer'):
+            ...
+
+    If disabled, all stages share a no-op context manager and nothing is
+    recorded, so instrumentation can stay in place.
+    """
+
+    # Upper bounds of histogram buckets in milliseconds
+    buckets = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+    _noStage = NoStage()
+
+    def __init__(self, enabled: bool=False, window: int=500,
+                 interval: float=60):
+
+        self._enabled = enabled
+        self._window = window
+        self._interval = interval
+        self._samples = {}
+        self._lock = Lock()
+        self._lastReport = monotonic()
+
+    @property
+    def enabled(self) -> bool:
+
+        return self._enabled
+
+    def stage(self, name: str) -> Stage or NoStage:
+
+        if not self._enabled:
+            return self._noStage
+
+        return Stage(self, name)
+
+    def record(self, name: str, duration: float):
+
+        if not self._enabled:
+            return
+
+        with self._lock:
+            if name not in self._samples:
+                self._samples[name] = deque(maxlen=self._window)
+            self._samples[name].append(duration)
+
+    def due(self) -> bool:
+
+        # True once per report interval
+        if not self._enabled or monotonic() - self._lastReport < self._interval:
+            return False
+
+        self._lastReport = monotonic()
+        return True
+
+    def summary(self) -> dict:
+
+        with self._lock:
+            samples = {name: sorted(values)
+                       for name, values in self._samples.items()}
+
+        summary = {}
+        for name, values in samples.items():
+            if len(values) == 0:
+                continue
+            ms = [value * 1000 for value in values]
+            histogram = [0] * (len(self.buckets) + 1)
+            for value in ms:
+                histogram[next((i for i, bound in enumerate(self.buckets)
+                                if value <= bound), len(self.buckets))] += 1
+            summary[name] = {
+                'count': len(ms),
+                'mean': sum(ms) / len(ms),
+                'p50': ms[len(ms) // 2],
+                'p90': ms[int(len(ms) * 0.9)],
+                'max': ms[-1],
+                'histogram': histogram}
+
+        return summary
+
+    @staticmethod
+    def format(summary: dict) -> str:
+
+        return '\n'.join(
+            '{:<24} n={:<5} mean={:8.1f}ms p50={:8.1f}ms p90={:8.1f}ms '
+            'max={:8.1f}ms'.format(name, stats['count'], stats['mean'],
+                                   stats['p50'], stats['p90'], stats['max'])
+            for name, stats in sorted(summary.items()))
+
+    def dump(self, filename: str):
+
+        if not self._enabled:
+            return
+
+        logging.info('Writing metrics to "%s"', filename)
+        try:
+            with open(filename, 'w') as f:
+                json.dump({'buckets': self.buckets,
+                           'stages': self.summary()}, f, indent=2)
+        except OSError as e:
+            logging.warning('Cannot write metrics: {}'.format(e))
@@ -17,8 +17,11 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program. If not, see <http://www.gnu.org/licenses/>.
 
+import copy
 import logging
-from photobooth.Threading import Communicator
+from photobooth import Codec
+from photobooth.Metrics import Metrics
+from photobooth.Threading import Communicator, Frame
 from photobooth.worker.PictureList import Picture, PictureRef, Shot
 
 
@@ -28,6 +31,7 @@ class Context:
 
         super().__init__()
         self._comm = communicator
+        self._payloads = ()
         self.is_running = False
         if omit_welcome:
             self.state = StartupState()
@@ -63,6 +67,19 @@ class Context:
         self._state = new_state
         self._comm.bcast(self._state)
 
+        # Keep the payloads of the latest state alive as long as they can
+        # be sent again (e.g., when retrying after an error)
+        payloads = new_state.payloadValues()
+        if len(payloads) > 0 and payloads != self._payloads:
+            self.releasePayloads()
+            self._payloads = payloads
+
+    def releasePayloads(self):
+
+        if self._comm.blobs is not None:
+            self._comm.blobs.release(self._payloads)
+        self._payloads = ()
+
     def handleEvent(self, event):
 
         if not isinstance(event, Event):
@@ -73,6 +90,18 @@ class Context:
         if isinstance(event, ErrorEvent):
             self.state = ErrorState(event.origin, event.message, self.state,
                                     self.is_running)
+        elif isinstance(event, MetricsEvent):
+            logging.info('Context: Metrics of {}:\n{}'.format(
+                event.origin, Metrics.format(event.metrics)))
+            if self._comm.stats is not None:
+                logging.info('Context: Queue statistics:\n{}'.format(
+                    self._comm.stats.format(self._comm.stats.summary())))
+        elif (isinstance(event, CameraEvent) and event.name == 'ready'
+              and not isinstance(self.state, StartupState)):
+            # A restarted camera reports ready once more, which does not
+            # affect the current state
+            logging.info('Context: Camera is ready again')
+            self.num_shots = event.num_shots
         elif isinstance(event, TeardownEvent):
             self.is_running = False
             self.state = TeardownState(event.target)
@@ -88,6 +117,8 @@ class Context:
 
 class Event:
 
+    __slots__ = ('_name', )
+
     def __init__(self, name: str):
 
         super().__init__()
@@ -113,6 +144,8 @@ class Event:
 
 class ErrorEvent(Event):
 
+    __slots__ = ('_origin', '_message')
+
     def __init__(self, origin: str, message: str):
 
         super().__init__('Error')
@@ -150,8 +183,31 @@ class ErrorEvent(Event):
         self._message = message
 
 
+class MetricsEvent(Event):
+
+    __slots__ = ('_origin', '_metrics')
+
+    def __init__(self, origin: str, metrics: dict):
+
+        super().__init__('Metrics')
+        self._origin = origin
+        self._metrics = metrics
+
+    @property
+    def origin(self):
+
+        return self._origin
+
+    @property
+    def metrics(self):
+
+        return self._metrics
+
+
 class TeardownEvent(Event):
 
+    __slots__ = ('_target', )
+
     EXIT = 0
     RESTART = 1
     WELCOME = 2
@@ -169,6 +225,8 @@ class TeardownEvent(Event):
 
 class GuiEvent(Event):
 
+    __slots__ = ('_pictureRef', '_postprocessAction')
+
     def __init__(self, name: str, pictureRef: PictureRef=None, postprocessAction: str=None):
 
         super().__init__(name)
@@ -187,21 +245,24 @@ class GuiEvent(Event):
 
 class GpioEvent(Event):
 
-    pass
+    __slots__ = ()
 
 class WebEvent(Event):
 
-    pass
+    __slots__ = ()
 
 
 class CameraEvent(Event):
 
-    def __init__(self, name, picture: Picture=None, shot: Shot=None, num_shots: int=None):
+    __slots__ = ('_picture', '_shot', '_num_shots', '_frame')
+
+    def __init__(self, name, picture: Picture=None, shot: Shot=None, num_shots: int=None, frame: Frame=None):
 
         super().__init__(name)
         self._picture = picture
         self._shot = shot
         self._num_shots = num_shots
+        self._frame = frame
 
     @property
     def picture(self):
@@ -218,13 +279,24 @@ class CameraEvent(Event):
 
         return self._num_shots
 
+    @property
+    def frame(self):
+
+        return self._frame
+
 class WorkerEvent(Event):
 
-    pass
+    __slots__ = ()
 
 
 class State:
 
+    __slots__ = ()
+
+    # Attributes carrying large payloads, these are only sent to processes
+    # that subscribed to them (see Communicator.subscribe)
+    payloads = ()
+
     def __init__(self):
 
         super().__init__()
@@ -234,6 +306,22 @@ class State:
 
         return type(self).__name__
 
+    def strip(self, keep: tuple[str]=()):
+
+        drop = [name for name in self.payloads if name not in keep]
+        if len(drop) == 0:
+            return self
+
+        stripped = copy.copy(self)
+        for name in drop:
+            setattr(stripped, '_' + name, None)
+        return stripped
+
+    def payloadValues(self) -> tuple:
+
+        return tuple(getattr(self, name) for name in self.payloads
+                     if getattr(self, name) is not None)
+
     def update(self):
 
         pass
@@ -245,6 +333,8 @@ class State:
 
 class ErrorState(State):
 
+    __slots__ = ('_origin', '_message', '_old_state', '_is_running')
+
     def __init__(self, origin, message, old_state, is_running):
 
         self.origin = origin
@@ -305,6 +395,20 @@ class ErrorState(State):
 
         self._is_running = running
 
+    def strip(self, keep: tuple[str]=()):
+
+        old_state = self.old_state.strip(keep)
+        if old_state is self.old_state:
+            return self
+
+        stripped = copy.copy(self)
+        stripped._old_state = old_state
+        return stripped
+
+    def payloadValues(self) -> tuple:
+
+        return self.old_state.payloadValues()
+
     def handleEvent(self, event: Event, context: Context):
 
         if isinstance(event, GuiEvent) and event.name == 'retry':
@@ -321,6 +425,8 @@ class ErrorState(State):
 
 class TeardownState(State):
 
+    __slots__ = ('_target', )
+
     def __init__(self, target):
 
         super().__init__()
@@ -344,6 +450,8 @@ class TeardownState(State):
 
 class WelcomeState(State):
 
+    __slots__ = ()
+
     def __init__(self):
 
         super().__init__()
@@ -361,6 +469,8 @@ class WelcomeState(State):
 
 class StartupState(State):
 
+    __slots__ = ()
+
     def __init__(self):
 
         super().__init__()
@@ -377,6 +487,8 @@ class StartupState(State):
 
 class IdleState(State):
 
+    __slots__ = ()
+
     def __init__(self):
 
         super().__init__()
@@ -395,6 +507,8 @@ class IdleState(State):
 
 class SlideshowState(State):
 
+    __slots__ = ()
+
     def __init__(self):
 
         super().__init__()
@@ -413,6 +527,8 @@ class SlideshowState(State):
 
 class GalleryState(State):
 
+    __slots__ = ()
+
     def __init__(self):
 
         super().__init__()
@@ -431,6 +547,8 @@ class GalleryState(State):
 
 class GallerySelectState(State):
 
+    __slots__ = ('_pictureRef', '_action')
+
     def __init__(self, pictureRef: PictureRef=None, action: str=None):
 
         super().__init__()
@@ -465,6 +583,8 @@ class GallerySelectState(State):
 
 class GreeterState(State):
 
+    __slots__ = ('_num_shots', )
+
     def __init__(self, num_shots: int=None):
 
         super().__init__()
@@ -485,6 +605,8 @@ class GreeterState(State):
 
 class CountdownState(State):
 
+    __slots__ = ('_num_picture', '_num_shots')
+
     def __init__(self, num_picture: int, num_shots: int=0):
 
         super().__init__()
@@ -514,6 +636,8 @@ class CountdownState(State):
 
 class CaptureState(State):
 
+    __slots__ = ('_num_picture', '_num_shots')
+
     def __init__(self, num_picture: int, num_shots: int):
 
         super().__init__()
@@ -537,12 +661,16 @@ class CaptureState(State):
             context.state = CountdownState(self.num_picture + 1, self._num_shots)
         elif isinstance(event, CameraEvent) and event.name == 'assemble':
             context.state = AssembleState()
+        elif isinstance(event, CameraEvent) and event.name == 'abort':
+            context.state = IdleState()
         else:
             raise TypeError('Unknown Event type "{}"'.format(event))
 
 
 class AssembleState(State):
 
+    __slots__ = ()
+
     def __init__(self):
 
         super().__init__()
@@ -551,12 +679,18 @@ class AssembleState(State):
 
         if isinstance(event, CameraEvent) and event.name == 'review':
             context.state = ReviewState(event.picture)
+        elif isinstance(event, CameraEvent) and event.name == 'abort':
+            context.state = IdleState()
         else:
             raise TypeError('Unknown Event type "{}"'.format(event))
 
 
 class ReviewState(State):
 
+    __slots__ = ('_picture', )
+
+    payloads = ('picture', )
+
     def __init__(self, picture: Picture):
 
         super().__init__()
@@ -577,6 +711,8 @@ class ReviewState(State):
 
 class PostprocessState(State):
 
+    __slots__ = ('_pictureRef', '_action')
+
     def __init__(self, pictureRef: PictureRef=None, action: str=None):
 
         super().__init__()
@@ -604,3 +740,18 @@ class PostprocessState(State):
             context.state = PostprocessState(event.pictureRef, event.postprocessAction)
         else:
             raise TypeError('Unknown Event type "{}"'.format(event))
+
+
+# Fixed tags for the compact serialization of messages (see Codec)
+for tag, cls in enumerate((Picture, PictureRef), 8):
+    Codec.register(cls, tag)
+for tag, cls in enumerate((Event, ErrorEvent, MetricsEvent, TeardownEvent,
+                           GuiEvent, GpioEvent, WebEvent, CameraEvent,
+                           WorkerEvent), 16):
+    Codec.register(cls, tag)
+for tag, cls in enumerate((State, ErrorState, TeardownState, WelcomeState,
+                           StartupState, IdleState, SlideshowState,
+                           GalleryState, GallerySelectState, GreeterState,
+                           CountdownState, CaptureState, AssembleState,
+                           ReviewState, PostprocessState), 32):
+    Codec.register(cls, tag)
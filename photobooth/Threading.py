@@ -17,8 +17,21 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program. If not, see <http://www.gnu.org/licenses/>.
 
+import os
+import queue
+import shutil
+import struct
+import tempfile
 from enum import IntEnum
-from multiprocessing import Queue
+from io import BytesIO
+from multiprocessing import Event, Lock, Queue
+from multiprocessing.sharedctypes import RawArray, RawValue
+from multiprocessing.shared_memory import SharedMemory
+from time import monotonic
+from typing import NamedTuple
+
+from photobooth import Codec
+from photobooth.Metrics import Metrics
 
 class Workers(IntEnum):
 
@@ -29,39 +42,514 @@ class Workers(IntEnum):
     WEB = 4
     WORKER = 5
 
-class Communicator:
+class Frame(NamedTuple):
+    slot: int
+    seq: int
+    size: tuple[int, int]
+
+
+class FrameRing:
+    """A fixed-size ring of raw RGB frame slots in shared memory.
+
+    Frames are written by a single producer and referenced by a `Frame`
+    (slot index and sequence number) that is small enough to be sent through
+    the queues. Every slot carries a sequence number header that is reset
+    while the slot is written, so a reader can detect a frame that got
+    overwritten while it was being copied.
+    """
+
+    _header = struct.Struct('Q')
+
+    def __init__(self, frame_size: tuple[int, int], num_slots: int=3):
+
+        super().__init__()
+
+        self._slot_size = frame_size[0] * frame_size[1] * 3
+        self._stride = self._header.size + self._slot_size
+        self._num_slots = num_slots
+        self._seq = 0
+        self._shm = SharedMemory(create=True, size=self._stride * num_slots)
+
+    @property
+    def slotSize(self) -> int:
+
+        return self._slot_size
+
+    def fits(self, size: tuple[int, int]) -> bool:
+
+        return size[0] * size[1] * 3 <= self._slot_size
+
+    def write(self, data: bytes, size: tuple[int, int]) -> Frame:
+
+        if len(data) != size[0] * size[1] * 3 or not self.fits(size):
+            raise ValueError('Frame data does not fit into a slot')
+
+        self._seq += 1
+        slot = self._seq % self._num_slots
+        offset = slot * self._stride
+        buf = self._shm.buf
+
+        self._header.pack_into(buf, offset, 0)
+        start = offset + self._header.size
+        buf[start:start + len(data)] = data
+        self._header.pack_into(buf, offset, self._seq)
+
+        return Frame(slot, self._seq, size)
+
+    def read(self, frame: Frame) -> bytes or None:
+
+        offset = frame.slot * self._stride
+        buf = self._shm.buf
+
+        if self._header.unpack_from(buf, offset)[0] != frame.seq:
+            return None
+
+        start = offset + self._header.size
+        data = bytes(buf[start:start + frame.size[0] * frame.size[1] * 3])
+
+        # Discard the frame if the producer started overwriting it meanwhile
+        if self._header.unpack_from(buf, offset)[0] != frame.seq:
+            return None
+
+        return data
+
+    def close(self):
+
+        self._shm.close()
+
+    def unlink(self):
+
+        self._shm.close()
+        self._shm.unlink()
+
+
+class Mailbox:
+    """A conflating channel that only holds the latest message.
+
+    Putting a message overwrites a previous one that has not been taken yet.
+    The receiver needs to be notified only when the mailbox turns from empty
+    to full, which is signalled by the return value of `put`.
+    """
+
+    def __init__(self, capacity: int=1 << 16):
+
+        super().__init__()
+
+        self._lock = Lock()
+        self._taken = Event()
+        self._taken.set()
+        self._length = RawValue('L', 0)
+        self._data = RawArray('B', capacity)
+
+    def put(self, message: any) -> bool:
+
+        data = Codec.dumps(message)
+        if len(data) > len(self._data):
+            raise ValueError('Message does not fit into mailbox')
+
+        with self._lock:
+            notify = self._length.value == 0
+            memoryview(self._data).cast('B')[:len(data)] = data
+            self._length.value = len(data)
+            self._taken.clear()
+
+        return notify
+
+    def take(self) -> any:
+
+        with self._lock:
+            length = self._length.value
+            if length == 0:
+                return None
+            data = bytes(memoryview(self._data).cast('B')[:length])
+            self._length.value = 0
+            self._taken.set()
+
+        return Codec.loads(data)
+
+    def wait(self, timeout: float=None) -> bool:
+
+        return self._taken.wait(timeout)
+
+
+class MailboxNotification:
+
+    __slots__ = ()
+
+
+class Blob(NamedTuple):
+    name: str
+    size: int
+
+
+class BlobStore:
+    """Reference counted byte blobs shared between processes.
+
+    Blobs are stored as files in a tmpfs directory, so only the `Blob` handle
+    needs to be sent through the queues. The reference count is kept in a
+    header in front of the data and guarded by a lock shared by all
+    processes. A blob is deleted once its last reference is released.
+    """
+
+    _header = struct.Struct('q')
 
     def __init__(self):
 
         super().__init__()
 
+        if os.access('/dev/shm', os.W_OK):
+            basedir = '/dev/shm'
+        else:
+            basedir = tempfile.gettempdir()
+        self._dir = tempfile.mkdtemp(prefix='photobooth-', dir=basedir)
+        self._lock = Lock()
+
+    @staticmethod
+    def _blobs(handles: any):
+
+        if isinstance(handles, Blob):
+            yield handles
+        elif isinstance(handles, tuple):
+            for handle in handles:
+                yield from BlobStore._blobs(handle)
+
+    def _path(self, blob: Blob) -> str:
+
+        return os.path.join(self._dir, blob.name)
+
+    def put(self, data: BytesIO or bytes, refs: int=1) -> Blob:
+
+        if isinstance(data, BytesIO):
+            data = data.getbuffer()
+
+        fd, path = tempfile.mkstemp(dir=self._dir)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(self._header.pack(refs))
+            f.write(data)
+
+        return Blob(os.path.basename(path), len(data))
+
+    def putEach(self, items: tuple) -> tuple:
+
+        # Identical buffers are stored once and referenced multiple times,
+        # missing (None) items stay None
+        blobs = {id(None): None}
+        for data in items:
+            if id(data) in blobs:
+                self.retain(blobs[id(data)])
+            else:
+                blobs[id(data)] = self.put(data)
+
+        return type(items)(*(blobs[id(data)] for data in items))
+
+    def load(self, blob: Blob or BytesIO) -> BytesIO:
+
+        if not isinstance(blob, Blob):
+            return blob
+
+        with open(self._path(blob), 'rb') as f:
+            f.seek(self._header.size)
+            return BytesIO(f.read(blob.size))
+
+    def loadEach(self, items: tuple) -> tuple:
+
+        return type(items)(*(self.load(blob) for blob in items))
+
+    def _count(self, blob: Blob, delta: int):
+
+        path = self._path(blob)
+        with self._lock:
+            fd = os.open(path, os.O_RDWR)
+            try:
+                header = os.pread(fd, self._header.size, 0)
+                refs = self._header.unpack(header)[0] + delta
+                os.pwrite(fd, self._header.pack(refs), 0)
+            finally:
+                os.close(fd)
+
+            if refs <= 0:
+                os.remove(path)
+
+    def retain(self, handles: any, count: int=1):
+
+        for blob in self._blobs(handles):
+            self._count(blob, count)
+
+    def release(self, handles: any):
+
+        for blob in self._blobs(handles):
+            self._count(blob, -1)
+
+    def cleanup(self):
+
+        shutil.rmtree(self._dir, ignore_errors=True)
+
+
+class Envelope(NamedTuple):
+    data: bytes
+    sent: float
+
+
+class QueueStats:
+    """
+    Counters of the messages passed through each worker's queue, kept in
+    shared memory so the master can read what all processes sent and
+    received. Latencies are measured with the system-wide monotonic clock.
+    """
+
+    _fields = ('sent', 'received', 'bytes', 'max_depth', 'latency_sum',
+               'latency_max')
+
+    def __init__(self):
+
+        self._width = len(self._fields) + len(Metrics.buckets) + 1
+        self._values = RawArray('d', len(Workers) * self._width)
+        self._lock = Lock()
+
+    def _offset(self, worker: Workers, field: str) -> int:
+
+        return worker * self._width + self._fields.index(field)
+
+    def sent(self, worker: Workers, size: int):
+
+        with self._lock:
+            self._values[self._offset(worker, 'sent')] += 1
+            self._values[self._offset(worker, 'bytes')] += size
+            depth = (self._values[self._offset(worker, 'sent')] -
+                     self._values[self._offset(worker, 'received')])
+            max_depth = self._offset(worker, 'max_depth')
+            self._values[max_depth] = max(self._values[max_depth], depth)
+
+    def received(self, worker: Workers, latency: float):
+
+        latency *= 1000
+        bucket = next((i for i, bound in enumerate(Metrics.buckets)
+                       if latency <= bound), len(Metrics.buckets))
+        with self._lock:
+            self._values[self._offset(worker, 'received')] += 1
+            self._values[self._offset(worker, 'latency_sum')] += latency
+            latency_max = self._offset(worker, 'latency_max')
+            self._values[latency_max] = max(self._values[latency_max],
+                                            latency)
+            self._values[worker * self._width + len(self._fields) +
+                         bucket] += 1
+
+    def summary(self) -> dict:
+
+        with self._lock:
+            values = list(self._values)
+
+        summary = {}
+        for worker in Workers:
+            row = values[worker * self._width:(worker + 1) * self._width]
+            stats = dict(zip(self._fields, row))
+            stats['depth'] = stats['sent'] - stats['received']
+            stats['histogram'] = row[len(self._fields):]
+            summary[worker.name] = stats
+
+        return summary
+
+    @staticmethod
+    def format(summary: dict) -> str:
+
+        return '\n'.join(
+            '{:<8} sent={:<6.0f} depth={:<3.0f} max_depth={:<3.0f} '
+            'bytes={:<10.0f} latency mean={:7.1f}ms max={:7.1f}ms'.format(
+                name, stats['sent'], stats['depth'], stats['max_depth'],
+                stats['bytes'],
+                stats['latency_sum'] / max(stats['received'], 1),
+                stats['latency_max'])
+            for name, stats in summary.items())
+
+
+class Communicator:
+
+    def __init__(self, preview_ring: FrameRing=None, blob_store: BlobStore=None,
+                 instrumented: bool=False):
+
+        super().__init__()
+
         self._queues = [Queue() for _ in Workers]
+        self._mailboxes = [Mailbox() for _ in Workers]
+        self._subscriptions = [None for _ in Workers]
+        self._preview_ring = preview_ring
+        self._blob_store = blob_store
+
+        # Messages are wrapped in envelopes with their send time and size
+        self._stats = QueueStats() if instrumented else None
+
+    @property
+    def previewRing(self) -> FrameRing:
+
+        return self._preview_ring
+
+    @property
+    def blobs(self) -> BlobStore:
+
+        return self._blob_store
+
+    @property
+    def stats(self) -> QueueStats or None:
+
+        return self._stats
+
+    def _put(self, worker: Workers, data: bytes):
+
+        # Messages are queued in their compact encoding (see Codec)
+        if self._stats is None:
+            self._queues[worker].put(data)
+        else:
+            self._stats.sent(worker, len(data))
+            self._queues[worker].put(Codec.dumps(Envelope(data, monotonic())))
+
+    def _take(self, worker: Workers, block: bool):
+
+        message = Codec.loads(self._queues[worker].get(block))
+        if isinstance(message, Envelope):
+            self._stats.received(worker, monotonic() - message.sent)
+            message = Codec.loads(message.data)
+        return message
+
+    def subscribe(self, worker: Workers, topics: list[tuple[type, tuple[str]]]):
+        """Declare the payloads a worker needs from broadcast messages.
+
+        Each topic is a tuple of message type and names of payload fields.
+        Messages matching a topic are delivered with these payload fields,
+        all other broadcast messages are delivered with their payloads
+        stripped. Workers that never subscribed receive full messages.
+        """
+
+        if not isinstance(worker, Workers):
+            raise TypeError('worker must be a member of Workers')
+
+        self._subscriptions[worker] = list(topics)
+
+    def _select(self, worker: Workers, message: any) -> tuple[str] or None:
+
+        subscriptions = self._subscriptions[worker]
+        if subscriptions is None or not hasattr(message, 'strip'):
+            return None
+
+        return tuple(field for topic, fields in subscriptions
+                     if isinstance(message, topic) for field in fields)
 
     def bcast(self, message: any):
 
-        for q in self._queues[1:]:
-            q.put(message)
+        # Strip and encode every distinct selection of payloads only once
+        variants = {None: message}
+        encoded = {}
+        for worker in list(Workers)[1:]:
+            keep = self._select(worker, message)
+            if keep not in variants:
+                variants[keep] = message.strip(keep)
+            if keep not in encoded:
+                encoded[keep] = Codec.dumps(variants[keep])
+
+            # Every receiver of a payload owns a reference to its blobs
+            if self._blob_store is not None and hasattr(message, 'payloadValues'):
+                self._blob_store.retain(variants[keep].payloadValues())
+
+            self._put(worker, encoded[keep])
+
+    def deliver(self, worker: Workers, message: any):
+        """Send a broadcast message to a single worker only.
+
+        The message is stripped according to the worker's subscriptions,
+        as it would have been by bcast (e.g., to re-sync a restarted worker).
+        """
+
+        if not isinstance(worker, Workers):
+            raise TypeError('worker must be a member of Workers')
+
+        keep = self._select(worker, message)
+        if keep is not None:
+            message = message.strip(keep)
+
+        if self._blob_store is not None and hasattr(message, 'payloadValues'):
+            self._blob_store.retain(message.payloadValues())
+
+        self._put(worker, Codec.dumps(message))
+
+    def reset(self, worker: Workers):
+        """Prepare the queue of an ended worker process for its successor.
+
+        The queue itself is kept, as all running processes hold it. Messages
+        left behind are discarded and their blobs released. A process killed
+        by a signal while waiting for messages (not by the supervisor, which
+        asks it to exit first) leaves the queue unusable, however.
+        """
+
+        if not isinstance(worker, Workers):
+            raise TypeError('worker must be a member of Workers')
+
+        while True:
+            try:
+                message = self._take(worker, False)
+            except queue.Empty:
+                return
+            if self._blob_store is not None and hasattr(message, 'payloadValues'):
+                self._blob_store.release(message.payloadValues())
 
     def send(self, target: Workers, message: any):
 
         if not isinstance(target, Workers):
             raise TypeError('target must be a member of Workers')
 
-        self._queues[target].put(message)
+        self._put(target, Codec.dumps(message))
+
+    def post(self, target: Workers, message: any):
+
+        if not isinstance(target, Workers):
+            raise TypeError('target must be a member of Workers')
+
+        if self._mailboxes[target].put(message):
+            self._put(target, Codec.dumps(MailboxNotification()))
+
+    def wait(self, target: Workers, timeout: float=None) -> bool:
+
+        if not isinstance(target, Workers):
+            raise TypeError('target must be a member of Workers')
+
+        return self._mailboxes[target].wait(timeout)
+
+    def _get(self, worker: Workers, block=True, take_posted=True):
+
+        while True:
+            message = self._take(worker, block)
+            if not isinstance(message, MailboxNotification) or not take_posted:
+                return message
+
+            message = self._mailboxes[worker].take()
+            if message is not None:
+                return message
 
     def recv(self, worker: Workers, block=True):
 
         if not isinstance(worker, Workers):
             raise TypeError('worker must be a member of Workers')
 
-        return self._queues[worker].get(block)
+        return self._get(worker, block)
+
+    def take(self, worker: Workers) -> any:
+        """Take the latest posted message, or None if it was taken already."""
+
+        if not isinstance(worker, Workers):
+            raise TypeError('worker must be a member of Workers')
+
+        return self._mailboxes[worker].take()
+
+    def iter(self, worker: Workers, take_posted: bool=True):
+        """Iterate over received messages until None is received.
 
-    def iter(self, worker: Workers):
+        Without take_posted, a `MailboxNotification` is returned instead of a
+        posted message, which the receiver takes only once it is ready to
+        handle it. Until then, the sender's `wait` keeps waiting.
+        """
 
         if not isinstance(worker, Workers):
             raise TypeError('worker must be a member of Workers')
 
-        return iter(self._queues[worker].get, None)
+        return iter(lambda: self._get(worker, take_posted=take_posted), None)
 
     def empty(self, worker: Workers):
 
@@ -69,3 +557,9 @@ class Communicator:
             raise TypeError('worker must be a member of Workers')
 
         return self._queues[worker].empty()
+
+
+Codec.register(Frame, 1)
+Codec.register(Blob, 2)
+Codec.register(MailboxNotification, 3)
+Codec.register(Envelope, 4)
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Photobooth - a flexible photo booth software
+# Copyright (C) 2023  <photobooth-lausanne at gmail dot com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Micro-benchmarks for hot paths of the photobooth, e.g.
+
+    python -m photobooth.benchmark preview
+"""
+
+import argparse
+import pickle
+import subprocess
+import sys
+from io import BytesIO
+from time import perf_counter
+
+from PIL import Image, ImageOps
+
+from photobooth import Codec, StateMachine
+from photobooth.camera import Camera, preview_transpositions
+from photobooth.Threading import Blob, Frame
+from photobooth.worker.PictureList import Picture
+
+# Common sensor resolutions of previews and pictures
+resolutions = ((640, 480), (1280, 720), (1920, 1080), (3280, 2464),
+               (4056, 3040), (6000, 4000))
+
+rotations = {0: None, 90: Image.ROTATE_90, 180: Image.ROTATE_180,
+             270: Image.ROTATE_270}
+
+# Modules imported at startup by the master and the processes, and optional
+# modules imported only when enabled in the config
+startup_modules = ('photobooth.main', 'photobooth.camera', 'photobooth.template',
+                   'photobooth.gui', 'photobooth.gui.QtGui.PyQtGui',
+                   'photobooth.worker', 'photobooth.gpio', 'photobooth.web',
+                   'photobooth.web.Server', 'photobooth.worker.PictureMailer',
+                   'photobooth.worker.PictureUploadS3',
+                   'photobooth.worker.PictureUploadWebdav',
+                   'photobooth.worker.PostprocessorPrinter')
+
+
+def measure(func, iterations: int) -> float:
+
+    # Best of all runs in milliseconds
+    best = float('inf')
+    for _ in range(iterations):
+        start = perf_counter()
+        func()
+        best = min(best, perf_counter() - start)
+    return best * 1000
+
+
+def testFrame(size: tuple[int, int]) -> bytes:
+
+    # Gradients and noise, to have a JPEG of realistic size
+    gradient = Image.linear_gradient('L').resize(size)
+    noise = Image.effect_noise(size, 32)
+    image = Image.merge('RGB', (gradient, noise, gradient.transpose(
+        Image.FLIP_LEFT_RIGHT)))
+    byte_data = BytesIO()
+    image.save(byte_data, format='jpeg', quality=85)
+    return byte_data.getvalue()
+
+
+def benchmarkPreview(args):
+
+    rotation = rotations[args.rotation]
+    display = tuple(int(x) for x in args.display.split('x'))
+    print('Preview to {}x{}, rotation {}, best of {} runs (ms)'.format(
+        *display, args.rotation, args.iterations))
+    print('{:>12} {:>10} {:>10} {:>10} {:>10}'.format(
+        'resolution', 'jpeg', 'jpeg fused', 'raw', 'raw fused'))
+
+    for size in resolutions:
+        data = testFrame(size)
+        decoded = Image.open(BytesIO(data))
+        decoded.load()
+
+        # Same computation of the display size as in Camera.startup
+        captured = size[::-1] if args.rotation in (90, 270) else size
+        factor = min(display[i] / captured[i] for i in range(2))
+        display_size = tuple(int(captured[i] * factor) for i in range(2))
+        resize_size = (display_size[::-1] if args.rotation in (90, 270)
+                       else display_size)
+        transposition = preview_transpositions[rotation]
+
+        def current(picture):
+            if rotation is not None:
+                picture = picture.transpose(rotation)
+            picture = picture.resize(display_size, resample=Image.BOX)
+            return ImageOps.mirror(picture)
+
+        def fused(picture):
+            return Camera.transformPreview(picture, resize_size,
+                                           transposition)
+
+        results = (
+            measure(lambda: current(Image.open(BytesIO(data))),
+                    args.iterations),
+            measure(lambda: fused(Image.open(BytesIO(data))),
+                    args.iterations),
+            measure(lambda: current(decoded), args.iterations),
+            measure(lambda: fused(decoded), args.iterations))
+        print('{:>12} {:>10.1f} {:>10.1f} {:>10.1f} {:>10.1f}'.format(
+            '{}x{}'.format(*size), *results))
+
+
+class Unslotted:
+    """Copy of a message with an instance dictionary, i.e., like message
+    classes without __slots__"""
+
+    def __init__(self, message: any):
+
+        for cls in type(message).__mro__:
+            for slot in cls.__dict__.get('__slots__', ()):
+                value = getattr(message, slot)
+                if isinstance(value, (StateMachine.Event, StateMachine.State)):
+                    value = Unslotted(value)
+                setattr(self, slot, value)
+
+
+def benchmarkIpc(args):
+
+    picture = Picture(Blob('tmpa1b2c3d4', 4500000), Blob('tmpe5f6g7h8', 4600000),
+                      Blob('tmpi9j0k1l2', 25000))
+    messages = {
+        'preview': StateMachine.CameraEvent('preview', frame=Frame(1, 42, (800, 480))),
+        'trigger': StateMachine.GuiEvent('trigger'),
+        'countdown': StateMachine.CountdownState(2, 4),
+        'review': StateMachine.ReviewState(picture),
+        'error': StateMachine.ErrorState('Camera', 'Failed to capture',
+                                         StateMachine.CountdownState(1, 4),
+                                         True)}
+
+    print('Serialize and deserialize, best of {} runs of {} messages '
+          '(us per message, bytes)'.format(args.iterations, args.messages))
+    print('{:>12} {:>16} {:>16} {:>16}'.format(
+        'message', 'pickle unslotted', 'pickle slotted', 'codec'))
+
+    def pickled(message):
+        return lambda: pickle.loads(pickle.dumps(message, pickle.HIGHEST_PROTOCOL))
+
+    def encoded(message):
+        return lambda: Codec.loads(Codec.dumps(message))
+
+    for name, message in messages.items():
+        unslotted = Unslotted(message)
+        results = []
+        for func, size in (
+                (pickled(unslotted), len(pickle.dumps(unslotted, pickle.HIGHEST_PROTOCOL))),
+                (pickled(message), len(pickle.dumps(message, pickle.HIGHEST_PROTOCOL))),
+                (encoded(message), len(Codec.dumps(message)))):
+            def run():
+                for _ in range(args.messages):
+                    func()
+            results.append('{:7.2f} {:>7}'.format(
+                measure(run, args.iterations) * 1000 / args.messages, size))
+        print('{:>12} {:>16} {:>16} {:>16}'.format(name, *results))
+
+
+def importTimes(module: str) -> list[tuple[int, int, str]] or str:
+
+    # Import in a fresh interpreter and parse the timings of -X importtime as
+    # (self, cumulative, name) in microseconds, or return the error. Modules
+    # imported at top level come with their indentation of a single space
+    result = subprocess.run(
+        (sys.executable, '-X', 'importtime', '-c', 'import ' + module),
+        stderr=subprocess.PIPE, text=True)
+    lines = result.stderr.splitlines()
+    if result.returncode != 0:
+        return lines[-1] if len(lines) > 0 else 'failed'
+
+    times = []
+    for line in lines:
+        if line.startswith('import time:') and '|' in line:
+            self_us, cumulative_us, name = line[12:].split('|')
+            if self_us.strip().isdigit():
+                times.append((int(self_us), int(cumulative_us), name))
+    return times
+
+
+def benchmarkImports(args):
+
+    def total(times):
+        return sum(cumulative for _, cumulative, name in times
+                   if not name.startswith('  '))
+
+    modules = args.modules or startup_modules
+    print('Import in a fresh interpreter, best of {} runs (ms)'.format(
+        args.iterations))
+    print('{:<42} {:>8}  {}'.format('module', 'total', 'slowest imports'))
+
+    for module in modules:
+        best = None
+        for _ in range(args.iterations):
+            times = importTimes(module)
+            if isinstance(times, str):
+                best = times
+                break
+            if best is None or total(times) < total(best):
+                best = times
+
+        if isinstance(best, str):
+            print('{:<42} {:>8}  {}'.format(module, '-', best))
+            continue
+
+        slowest = sorted(best, reverse=True)[:args.top]
+        print('{:<42} {:>8.1f}  {}'.format(module, total(best) / 1000, ', '.join(
+            '{} {:.1f}'.format(name.strip(), self_us / 1000)
+            for self_us, _, name in slowest)))
+
+
+def main(argv):
+
+    parser = argparse.ArgumentParser(prog='python -m photobooth.benchmark')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    preview = commands.add_parser(
+        'preview', help='current vs. fused preview transformation, for JPEG '
+        'previews and already decoded frames')
+    preview.add_argument('-n', '--iterations', type=int, default=10)
+    preview.add_argument('-r', '--rotation', type=int, default=0,
+                         choices=rotations.keys())
+    preview.add_argument('-d', '--display', type=str, default='800x480',
+                         help='size of the gui (default 800x480)')
+    preview.set_defaults(func=benchmarkPreview)
+
+    ipc = commands.add_parser(
+        'ipc', help='serialization of messages between processes, pickled '
+        'with and without __slots__ vs. the compact codec')
+    ipc.add_argument('-n', '--iterations', type=int, default=10)
+    ipc.add_argument('-m', '--messages', type=int, default=10000)
+    ipc.set_defaults(func=benchmarkIpc)
+
+    imports = commands.add_parser(
+        'imports', help='startup time of the processes, as import time of '
+        'their modules and the slowest modules imported along')
+    imports.add_argument('modules', nargs='*',
+                         help='modules to import (default startup modules)')
+    imports.add_argument('-n', '--iterations', type=int, default=3)
+    imports.add_argument('-t', '--top', type=int, default=3,
+                         help='number of slowest imports listed')
+    imports.set_defaults(func=benchmarkImports)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Photobooth - a flexible photo booth software
+# Copyright (C) 2023  <photobooth-lausanne at gmail dot com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import io
+import logging
+import random
+from concurrent.futures import ThreadPoolExecutor
+from time import sleep
+
+from PIL import Image
+
+from photobooth.Config import Config
+
+from .CameraInterface import CameraInterface
+
+
+class CameraBenchmark(CameraInterface):
+    """
+    Synthetic camera for reproducible performance runs without hardware.
+    It hands out a fixed sequence of textured JPEGs of configurable size
+    (see [Benchmark] in the config) and simulates shutter and transfer
+    latency.
+    """
+
+    def __init__(self):
+
+        super().__init__()
+
+        self.hasPreview = True
+        self.hasIdle = False
+
+        logging.info('Using CameraBenchmark')
+
+        self._numPicture = 0
+        self._numPreview = 0
+        self._io = ThreadPoolExecutor(max_workers=1)
+
+    def configure(self, config: Config):
+
+        self._size = (config.getInt('Benchmark', 'width'),
+                      config.getInt('Benchmark', 'height'))
+        self._previewSize = (config.getInt('Benchmark', 'preview_width'),
+                             config.getInt('Benchmark', 'preview_height'))
+        self._shutterLatency = config.getFloat('Benchmark', 'shutter_latency')
+        self._transferLatency = config.getFloat('Benchmark', 'transfer_latency')
+        self._previewLatency = config.getFloat('Benchmark', 'preview_latency')
+
+        # Frames are generated once, so generating them is not measured
+        rng = random.Random(config.getInt('Benchmark', 'seed'))
+        noise = config.getFloat('Benchmark', 'noise')
+        quality = config.getInt('Benchmark', 'quality')
+        self._pictures = []
+        self._previews = []
+        for i in range(config.getInt('Benchmark', 'frames')):
+            picture = self._generateFrame(rng, i, noise)
+            self._pictures.append(self._encode(picture, quality))
+            self._previews.append(self._encode(
+                picture.resize(self._previewSize, Image.BOX), 75))
+        logging.info('Generated %d frames of size %s', len(self._pictures),
+                     self._size)
+
+    def cleanup(self):
+
+        self._io.shutdown()
+
+    def _generateFrame(self, rng: random.Random, num: int,
+                       noise: float) -> Image.Image:
+
+        # Smooth gradients overlaid with a seeded noise tile, shifted for
+        # each frame, to have JPEGs of realistic size and decode cost
+        tile_size = 256
+        tile = Image.frombytes('L', (tile_size, tile_size),
+                               bytes(rng.getrandbits(8)
+                                     for _ in range(tile_size * tile_size)))
+        texture = Image.new('L', self._size)
+        offset = num * tile_size // 7
+        for x in range(-offset, self._size[0], tile_size):
+            for y in range(-offset, self._size[1], tile_size):
+                texture.paste(tile, (x, y))
+
+        gradient = Image.linear_gradient('L')
+        base = Image.merge('RGB', (
+            gradient.resize(self._size),
+            gradient.transpose(Image.ROTATE_90).resize(self._size),
+            Image.radial_gradient('L').resize(self._size)))
+        return Image.blend(base, texture.convert('RGB'), noise)
+
+    @staticmethod
+    def _encode(picture: Image.Image, quality: int) -> bytes:
+
+        byte_data = io.BytesIO()
+        picture.save(byte_data, format='jpeg', quality=quality)
+        return byte_data.getvalue()
+
+    def probe(self):
+
+        return 'benchmark {}x{} / {}x{}'.format(*self._size,
+                                                *self._previewSize)
+
+    def getPreview(self):
+
+        sleep(self._previewLatency)
+        data = self._previews[self._numPreview % len(self._previews)]
+        self._numPreview += 1
+        return Image.open(io.BytesIO(data))
+
+    def getPicture(self):
+
+        return Image.open(self.getPictureBytes())
+
+    def getPictureBytes(self):
+
+        return self.getPictureAsync().result()
+
+    def getPictureAsync(self):
+
+        with self.metrics.stage('picture.capture'):
+            sleep(self._shutterLatency)
+        data = self._pictures[self._numPicture % len(self._pictures)]
+        self._numPicture += 1
+        return self._io.submit(self._transfer, data)
+
+    def _transfer(self, data: bytes) -> io.BytesIO:
+
+        with self.metrics.stage('picture.transfer'):
+            sleep(self._transferLatency)
+            return io.BytesIO(data)
@@ -17,6 +17,7 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program. If not, see <http://www.gnu.org/licenses/>.
 
+import io
 import logging
 import os
 
@@ -37,7 +38,9 @@ class CameraFake(CameraInterface):
 
 
         dirname, _ = os.path.split(os.path.abspath(__file__))
-        self._im = Image.open(f"{dirname}/fake.jpg") 
+        self._filename = f"{dirname}/fake.jpg"
+        with open(self._filename, 'rb') as f:
+            self._data = f.read()
 
 
         logging.info('Using CameraFake')
@@ -52,4 +55,11 @@ class CameraFake(CameraInterface):
 
         logging.debug('Get picture')
 
-        return self._im
+        # Hand out a new image every time, as previews are decoded in place
+        return Image.open(io.BytesIO(self._data))
+
+    def getPictureBytes(self):
+
+        logging.debug('Get picture')
+
+        return io.BytesIO(self._data)
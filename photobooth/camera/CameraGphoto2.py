@@ -19,6 +19,7 @@
 
 import io
 import logging
+from concurrent.futures import ThreadPoolExecutor
 
 from PIL import Image
 
@@ -38,13 +39,22 @@ class CameraGphoto2(CameraInterface):
 
         logging.info('Using python-gphoto2 bindings')
 
+        # All camera access goes through a single I/O thread, so pictures
+        # can be downloaded while the camera process carries on
+        self._io = ThreadPoolExecutor(max_workers=1)
+
         self._setupLogging()
         self._setupCamera()
 
     def cleanup(self):
 
-        self._changeConfig('Shutdown')
-        self._cap.exit(self._ctxt)
+        self._run(self._changeConfig, 'Shutdown')
+        self._run(self._cap.exit, self._ctxt)
+        self._io.shutdown()
+
+    def _run(self, func, *args):
+
+        return self._io.submit(func, *args).result()
 
     def _setupLogging(self):
 
@@ -62,7 +72,8 @@ class CameraGphoto2(CameraInterface):
 
         # read model specific configuration
         config = self._cap.get_config()
-        self.loadConfig(config.get_child_by_name('cameramodel').get_value())
+        self._model = config.get_child_by_name('cameramodel').get_value()
+        self.loadConfig(self._model)
 
         # set startup configuration
         self._changeConfig('Startup')
@@ -123,22 +134,50 @@ class CameraGphoto2(CameraInterface):
 
     def setActive(self):
 
-        self._changeConfig('Active')
+        # Queued behind a running download without waiting for it
+        self._io.submit(self._changeConfig, 'Active')
 
     def setIdle(self):
 
-        self._changeConfig('Idle')
+        self._run(self._changeConfig, 'Idle')
 
     def getPreview(self):
 
-        camera_file = self._cap.capture_preview()
+        with self.metrics.stage('preview.transfer'):
+            camera_file = self._run(self._cap.capture_preview)
         file_data = camera_file.get_data_and_size()
         return Image.open(io.BytesIO(file_data))
 
+    def probe(self):
+
+        config = self._run(self._cap.get_config)
+        values = [self._model]
+        for name in ('imageformat', 'imagesize'):
+            try:
+                values.append(config.get_child_by_name(name).get_value())
+            except gp.GPhoto2Error:
+                pass
+        return ' / '.join(values)
+
     def getPicture(self):
 
-        file_path = self._cap.capture(gp.GP_CAPTURE_IMAGE)
-        camera_file = self._cap.file_get(file_path.folder, file_path.name,
-                                         gp.GP_FILE_TYPE_NORMAL)
-        file_data = camera_file.get_data_and_size()
-        return Image.open(io.BytesIO(file_data))
+        return Image.open(self.getPictureBytes())
+
+    def getPictureBytes(self):
+
+        return self.getPictureAsync().result()
+
+    def getPictureAsync(self):
+
+        # Wait for the shutter only, the file is downloaded in the background
+        with self.metrics.stage('picture.capture'):
+            file_path = self._run(self._cap.capture, gp.GP_CAPTURE_IMAGE)
+        return self._io.submit(self._download, file_path)
+
+    def _download(self, file_path):
+
+        with self.metrics.stage('picture.transfer'):
+            camera_file = self._cap.file_get(file_path.folder, file_path.name,
+                                             gp.GP_FILE_TYPE_NORMAL)
+            file_data = camera_file.get_data_and_size()
+            return io.BytesIO(file_data)
@@ -124,6 +124,20 @@ class CameraGphoto2Cffi(CameraInterface):
 
         return Image.open(io.BytesIO(self._cap.get_preview()))
 
+    def probe(self):
+
+        try:
+            return ' / '.join((
+                self._cap.config['status']['cameramodel'].value,
+                self._cap.config['imgsettings']['imageformat'].value,
+                self._cap.config['imgsettings']['imagesize'].value))
+        except KeyError:
+            return None
+
     def getPicture(self):
 
-        return Image.open(io.BytesIO(self._cap.capture()))
+        return Image.open(self.getPictureBytes())
+
+    def getPictureBytes(self):
+
+        return io.BytesIO(self._cap.capture())
@@ -17,6 +17,7 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program. If not, see <http://www.gnu.org/licenses/>.
 
+import io
 import logging
 import os
 import subprocess
@@ -55,6 +56,12 @@ class CameraGphoto2CommandLine(CameraInterface):
         self._callGphoto('--capture-image-and-download', self._tmp_filename)
         return Image.open(self._tmp_filename)
 
+    def getPictureBytes(self):
+
+        self._callGphoto('--capture-image-and-download', self._tmp_filename)
+        with open(self._tmp_filename, 'rb') as f:
+            return io.BytesIO(f.read())
+
     def _callGphoto(self, action, filename):
 
         cmd = 'gphoto2 --force-overwrite --quiet {} --filename {}'
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Photobooth - a flexible photo booth software
+# Copyright (C) 2023  <photobooth-lausanne at gmail dot com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import io
+import logging
+import os
+import re
+import select
+import shutil
+import subprocess
+import tempfile
+
+from PIL import Image
+
+from .CameraInterface import CameraInterface
+
+
+class CameraGphoto2Shell(CameraInterface):
+    """
+    Talks to a single long-running `gphoto2 --shell` process over pipes,
+    so the camera is only detected and initialized once instead of on
+    every capture.
+    """
+
+    # The shell prints a prompt like "gphoto2: {/store_00010001} /> " once
+    # it is done with a command
+    _prompt = re.compile(rb'gphoto2: \{[^}]*\}[^\n]*> $')
+
+    def __init__(self, command=('gphoto2', '--shell', '--force-overwrite'),
+                 timeout=30):
+
+        super().__init__()
+
+        self.hasPreview = True
+        self.hasIdle = False
+
+        logging.info('Using gphoto2 via persistent shell')
+
+        self._command = command
+        self._timeout = timeout
+        self._shell = None
+
+        # Downloaded files end up in the working directory of the shell
+        tmp_dir = '/dev/shm' if os.access('/dev/shm', os.W_OK) else None
+        self._tmp_dir = tempfile.mkdtemp(prefix='photobooth-', dir=tmp_dir)
+        logging.debug('Storing temp files to "{}"'.format(self._tmp_dir))
+
+        self._startShell()
+
+    def cleanup(self):
+
+        if self._shell is not None:
+            try:
+                self._shell.stdin.write(b'exit\n')
+                self._shell.stdin.flush()
+                self._shell.wait(5)
+            except (OSError, subprocess.TimeoutExpired):
+                self._shell.kill()
+            self._shell = None
+
+        shutil.rmtree(self._tmp_dir, ignore_errors=True)
+
+    def _startShell(self):
+
+        self._shell = subprocess.Popen(self._command, cwd=self._tmp_dir,
+                                       stdin=subprocess.PIPE,
+                                       stdout=subprocess.PIPE,
+                                       stderr=subprocess.STDOUT, bufsize=0)
+        self._readResponse()
+
+    def _readResponse(self) -> list[str]:
+
+        output = b''
+        fd = self._shell.stdout.fileno()
+        while not self._prompt.search(output):
+            ready, _, _ = select.select([fd], [], [], self._timeout)
+            if not ready:
+                raise RuntimeError('gphoto2 shell did not respond')
+            data = os.read(fd, 4096)
+            if not data:
+                raise RuntimeError('gphoto2 shell terminated unexpectedly')
+            output += data
+
+        output = self._prompt.sub(b'', output).decode(errors='replace')
+        return [line.strip() for line in output.splitlines() if line.strip()]
+
+    def _call(self, command: str) -> list[str]:
+
+        # Restart the shell should it have died, e.g. after a USB reset
+        if self._shell.poll() is not None:
+            logging.warning('gphoto2 shell exited, restarting it')
+            self._startShell()
+
+        logging.debug('gphoto2 shell: {}'.format(command))
+        self._shell.stdin.write(command.encode() + b'\n')
+        self._shell.stdin.flush()
+        lines = [line for line in self._readResponse() if line != command]
+
+        errors = [line for line in lines if line.startswith('*** Error')]
+        if len(errors) > 0:
+            raise RuntimeError('gphoto2 shell command "{}" failed: {}'.format(
+                command, ' '.join(lines)))
+
+        return lines
+
+    def _download(self, lines: list[str]) -> io.BytesIO:
+
+        files = [line[len('Saving file as '):] for line in lines
+                 if line.startswith('Saving file as ')]
+        if len(files) == 0:
+            raise RuntimeError('gphoto2 shell did not save a file')
+
+        filename = os.path.join(self._tmp_dir, files[-1])
+        with open(filename, 'rb') as f:
+            byte_data = io.BytesIO(f.read())
+        os.remove(filename)
+        return byte_data
+
+    def probe(self):
+
+        values = []
+        for name in ('cameramodel', 'imageformat', 'imagesize'):
+            try:
+                lines = self._call('get-config {}'.format(name))
+            except RuntimeError:
+                continue
+            values += [line[len('Current: '):] for line in lines
+                       if line.startswith('Current: ')]
+        return ' / '.join(values) if len(values) > 0 else None
+
+    def getPreview(self):
+
+        with self.metrics.stage('preview.transfer'):
+            return Image.open(self._download(self._call('capture-preview')))
+
+    def getPicture(self):
+
+        return Image.open(self.getPictureBytes())
+
+    def getPictureBytes(self):
+
+        with self.metrics.stage('picture.capture'):
+            lines = self._call('capture-image-and-download')
+        with self.metrics.stage('picture.transfer'):
+            return self._download(lines)
@@ -20,6 +20,11 @@
 import configparser
 import logging
 import os
+from concurrent.futures import Future
+from io import BytesIO
+
+from photobooth.Config import Config
+from photobooth.Metrics import Metrics
 
 
 class CameraInterface:
@@ -28,6 +33,7 @@ class CameraInterface:
 
         self.hasPreview = False
         self.hasIdle = False
+        self.metrics = Metrics()
         self._initConfig()
 
     def __enter__(self):
@@ -97,6 +103,32 @@ class CameraInterface:
 
         raise NotImplementedError()
 
+    def configure(self, config: Config):
+
+        # Settings of the photobooth config, applied once after construction
+        pass
+
+    def probe(self) -> str or None:
+
+        # Cheap description of the camera and the settings that determine
+        # picture and preview sizes, None if sizes can't be cached
+        return None
+
+    def getPictureBytes(self) -> BytesIO:
+
+        # Cameras delivering JPEGs should hand them out without re-encoding
+        byte_data = BytesIO()
+        self.getPicture().save(byte_data, format='jpeg')
+        return byte_data
+
+    def getPictureAsync(self) -> Future:
+
+        # Returns once the picture is taken, cameras that can download it
+        # in the background resolve the future later
+        future = Future()
+        future.set_result(self.getPictureBytes())
+        return future
+
     def _initConfig(self):
 
         self._cfg = configparser.ConfigParser(interpolation=None)
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Photobooth - a flexible photo booth software
+# Copyright (C) 2023  <photobooth-lausanne at gmail dot com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+from threading import Condition, Thread
+from time import sleep
+
+from PIL import Image
+
+import cv2
+
+from .CameraOpenCV import CameraOpenCV
+
+
+class CameraOpenCVGrabber(CameraOpenCV):
+    """
+    OpenCV camera that keeps the device open and grabs frames continuously
+    in a background thread, so previews and pictures are available without
+    opening the device or waiting for a good frame.
+    """
+
+    def __init__(self, num_slots=3, timeout=5):
+
+        super().__init__()
+
+        # The device stays open, there is no idle mode
+        self.hasIdle = False
+
+        self._timeout = timeout
+        self._slots = [None] * num_slots
+        self._next = 0
+        self._latest = None
+        self._error = None
+
+        self._frame = Condition()
+        self._running = False
+        self._thread = None
+
+        logging.info('Grabbing frames in background')
+
+        self.setActive()
+
+    def cleanup(self):
+
+        if self._thread is not None:
+            self._running = False
+            self._thread.join()
+            self._thread = None
+        super().setIdle()
+
+    def setActive(self):
+
+        if self._thread is None:
+            super().setActive()
+            self._running = True
+            self._thread = Thread(target=self._grab, daemon=True)
+            self._thread.start()
+
+    def _grab(self):
+
+        while self._running:
+            # Decode into the oldest slot, reusing its buffer, but never
+            # into the one holding the latest good frame
+            with self._frame:
+                slot = self._next
+                if slot == self._latest:
+                    slot = (slot + 1) % len(self._slots)
+            status, frame = self._cap.read(self._slots[slot])
+            if not status:
+                with self._frame:
+                    self._error = 'Failed to capture picture'
+                sleep(0.1)
+                continue
+
+            # Check for black image on a downsampled view only
+            valid = frame[::8, ::8].max() > 0
+
+            with self._frame:
+                self._slots[slot] = frame
+                self._next = (slot + 1) % len(self._slots)
+                if valid:
+                    self._latest = slot
+                    self._error = None
+                    self._frame.notify_all()
+
+    def getPreview(self):
+
+        return self.getPicture()
+
+    def getPicture(self):
+
+        with self._frame:
+            if not self._frame.wait_for(lambda: self._latest is not None,
+                                        self._timeout):
+                raise RuntimeError(self._error or 'No picture captured')
+
+            # Convert while holding the lock, so the grabber does not
+            # overwrite the slot, OpenCV yields frames in BGR format
+            frame = cv2.cvtColor(self._slots[self._latest], cv2.COLOR_BGR2RGB)
+
+        return Image.fromarray(frame)
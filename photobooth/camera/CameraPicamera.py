@@ -43,6 +43,8 @@ class CameraPicamera(CameraInterface):
         self.setActive()
         self._preview_resolution = (self._cap.resolution[0] // 2,
                                     self._cap.resolution[1] // 2)
+        self._probe = '{} / {}'.format(self._cap.revision,
+                                       self._cap.resolution)
         self.setIdle()
 
     def setActive(self):
@@ -56,6 +58,10 @@ class CameraPicamera(CameraInterface):
             self._cap.close()
             self._cap = None
 
+    def probe(self):
+
+        return self._probe
+
     def getPreview(self):
 
         self.setActive()
@@ -67,8 +73,12 @@ class CameraPicamera(CameraInterface):
 
     def getPicture(self):
 
+        return Image.open(self.getPictureBytes())
+
+    def getPictureBytes(self):
+
         self.setActive()
         stream = io.BytesIO()
         self._cap.capture(stream, format='jpeg', resize=None)
         stream.seek(0)
-        return Image.open(stream)
+        return stream
@@ -85,6 +85,12 @@ class CameraPicamera2(CameraInterface):
             self._cap.stop()
             self._running = False
 
+    def probe(self):
+
+        return ' / '.join((self._cap.camera_properties['Model'],
+                           str(self._picture_config['main']['size']),
+                           str(self._preview_config['main']['size'])))
+
     def getPreview(self):
 
         self.setActive(self._preview_config)
@@ -95,8 +101,14 @@ class CameraPicamera2(CameraInterface):
 
     def getPicture(self):
 
-        self.setActive(self._picture_config)
+        return Image.open(self.getPictureBytes())
+
+    def getPictureBytes(self):
+
+        with self.metrics.stage('picture.configure'):
+            self.setActive(self._picture_config)
         stream = io.BytesIO()
-        self._cap.capture_file(stream, format='jpeg')
+        with self.metrics.stage('picture.capture'):
+            self._cap.capture_file(stream, format='jpeg')
         stream.seek(0)
-        return Image.open(stream)
+        return stream
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Photobooth - a flexible photo booth software
+# Copyright (C) 2023  <photobooth-lausanne at gmail dot com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import io
+import logging
+
+from PIL import Image
+
+from picamera2 import Picamera2
+
+from .CameraPicamera2 import CameraPicamera2
+
+
+class CameraPicamera2_dual(CameraPicamera2):
+    """
+    PiCamera2 streaming previews from a video configuration at preview
+    resolution, which runs the sensor in its fast binned mode, and switching
+    to a full resolution still configuration only for the capture itself.
+    The camera is never stopped, previews resume right after the capture.
+    """
+
+    def __init__(self, preview_modulo=4):
+
+        super().__init__(preview_modulo=preview_modulo)
+
+        # The camera keeps running, there is no idle mode
+        self.hasIdle = False
+
+        logging.info('Use dual-mode configuration for PiCamera2')
+
+    def setActive(self, config=None):
+
+        if self._cap is None:
+            self._cap = Picamera2()
+            size = self._cap.sensor_resolution
+            self._preview_config = self._cap.create_video_configuration(
+                main={'size': (size[0] // self._preview_modulo,
+                               size[1] // self._preview_modulo),
+                      'format': 'YUV420'})
+            self._picture_config = self._cap.create_still_configuration(
+                main={'size': size})
+            self._cap.align_configuration(self._preview_config)
+            self._cap.align_configuration(self._picture_config)
+            self._activeConfig = self._preview_config
+            self._cap.configure(self._preview_config)
+            logging.info('Set dual-mode configuration: {} / {}'.format(
+                self._picture_config['main'], self._preview_config['main']))
+        if not self._running:
+            self._cap.start()
+            self._running = True
+
+    def getPreview(self):
+
+        self.setActive()
+
+        # The preview stream is YUV420, convert the raw planes directly
+        # instead of encoding and decoding a JPEG
+        width, height = self._preview_config['main']['size']
+        yuv = self._cap.capture_array('main')
+        stride = yuv.shape[1]
+        y = yuv[:height, :width]
+        u = yuv[height:height + height // 4].reshape(
+            height // 2, stride // 2)[:, :width // 2]
+        v = yuv[height + height // 4:height + height // 2].reshape(
+            height // 2, stride // 2)[:, :width // 2]
+
+        return Image.merge('YCbCr', (
+            Image.fromarray(y),
+            Image.fromarray(u).resize((width, height)),
+            Image.fromarray(v).resize((width, height)))).convert('RGB')
+
+    def getPictureBytes(self):
+
+        self.setActive()
+
+        # Switches to the still configuration for a single frame and back
+        stream = io.BytesIO()
+        self._cap.switch_mode_and_capture_file(self._picture_config, stream,
+                                               format='jpeg')
+        stream.seek(0)
+        return stream
@@ -17,13 +17,19 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program. If not, see <http://www.gnu.org/licenses/>.
 
+import json
 import logging
+import os
+import struct
+from concurrent.futures import Future
+from time import monotonic, sleep
 from typing import Tuple
 
-from PIL import Image, ImageOps
+from PIL import Image
 from io import BytesIO
 from photobooth.Config import Config
 from photobooth.camera.CameraInterface import CameraInterface
+from photobooth.Metrics import Metrics
 from photobooth.template import Template
 
 from photobooth.worker.PictureList import Picture
@@ -37,12 +43,109 @@ modules = (
     ('gphoto2-cffi', 'CameraGphoto2Cffi', 'CameraGphoto2Cffi'),
     ('gphoto2-commandline', 'CameraGphoto2CommandLine',
      'CameraGphoto2CommandLine'),
+    ('gphoto2-shell', 'CameraGphoto2Shell', 'CameraGphoto2Shell'),
     ('opencv', 'CameraOpenCV', 'CameraOpenCV'),
+    ('opencv-grabber', 'CameraOpenCVGrabber', 'CameraOpenCVGrabber'),
     ('picamera', 'CameraPicamera', 'CameraPicamera'),
     ('picamera2', 'CameraPicamera2', 'CameraPicamera2'),
     ('picamera2_zero', 'CameraPicamera2_zero', 'CameraPicamera2_zero'),
+    ('picamera2_dual', 'CameraPicamera2_dual', 'CameraPicamera2_dual'),
     ('dummy', 'CameraDummy', 'CameraDummy'),
-    ('fake', 'CameraFake', 'CameraFake'))
+    ('fake', 'CameraFake', 'CameraFake'),
+    ('benchmark', 'CameraBenchmark', 'CameraBenchmark'))
+
+# EXIF orientation tag values for rotations by the given transposition
+exif_orientations = {None: 1, Image.ROTATE_90: 8, Image.ROTATE_180: 3,
+                     Image.ROTATE_270: 6}
+
+# Single transposition for rotating by the given transposition and mirroring
+preview_transpositions = {None: Image.FLIP_LEFT_RIGHT,
+                          Image.ROTATE_90: Image.TRANSVERSE,
+                          Image.ROTATE_180: Image.FLIP_TOP_BOTTOM,
+                          Image.ROTATE_270: Image.TRANSPOSE}
+
+
+def setJpegOrientation(data: bytes, orientation: int) -> bytes or None:
+    """
+    Set the EXIF orientation of a JPEG without touching the image data.
+    The tag is rewritten in place or added to the existing EXIF segment. If
+    there is no EXIF segment yet, or it cannot be parsed, a minimal one is
+    used instead. Returns None if the data is not a JPEG.
+    """
+    if data[:2] != b'\xff\xd8':
+        return None
+
+    pos = insert = 2
+    while pos + 4 <= len(data) and data[pos] == 0xff:
+        marker = data[pos + 1]
+        if marker in (0xda, 0xd9):  # Start of scan, end of image
+            break
+        length, = struct.unpack_from('>H', data, pos + 2)
+        if marker == 0xe1 and data[pos + 4:pos + 10] == b'Exif\0\0':
+            patched = _setExifOrientation(data, pos, length, orientation)
+            if patched is not None:
+                return patched
+            # Replace the segment that cannot be patched
+            data = data[:pos] + data[pos + 2 + length:]
+            insert = pos
+            break
+        if marker == 0xe0:  # Keep JFIF header first
+            insert = pos + 2 + length
+        pos += 2 + length
+
+    if orientation == 1:
+        return data
+
+    exif = struct.pack('>6s2sHIHHHIHHI', b'Exif\0\0', b'MM', 42, 8, 1,
+                       0x0112, 3, 1, orientation, 0, 0)
+    segment = struct.pack('>BBH', 0xff, 0xe1, len(exif) + 2) + exif
+    return data[:insert] + segment + data[insert:]
+
+
+def _setExifOrientation(data: bytes, segment: int, length: int,
+                        orientation: int) -> bytes or None:
+
+    tiff = segment + 10
+    end = segment + 2 + length
+    order = {b'II': '<', b'MM': '>'}.get(data[tiff:tiff + 2])
+    if order is None or end > len(data):
+        return None
+
+    ifd = tiff + struct.unpack_from(order + 'I', data, tiff + 4)[0]
+    if ifd + 2 > end:
+        return None
+    count, = struct.unpack_from(order + 'H', data, ifd)
+    if ifd + 6 + 12 * count > end:
+        return None
+
+    entries = []
+    for entry in range(ifd + 2, ifd + 2 + 12 * count, 12):
+        tag, kind = struct.unpack_from(order + 'HH', data, entry)
+        if tag == 0x0112 and kind == 3:
+            patched = bytearray(data)
+            struct.pack_into(order + 'H', patched, entry + 8, orientation)
+            return bytes(patched)
+        entries.append(data[entry:entry + 12])
+
+    if orientation == 1:
+        return data
+
+    # Without an orientation tag, IFD0 is copied with the tag added to the
+    # end of the segment, so none of the offsets of other values change
+    entries.append(struct.pack(order + 'HHIHH', 0x0112, 3, 1, orientation, 0))
+    entries.sort(key=lambda entry: struct.unpack_from(order + 'H', entry)[0])
+    padding = b'\0' * ((end - tiff) % 2)
+    next_ifd = data[ifd + 2 + 12 * count:ifd + 6 + 12 * count]
+    table = (padding + struct.pack(order + 'H', len(entries)) +
+             b''.join(entries) + next_ifd)
+    if length + len(table) > 0xffff:
+        return None
+
+    patched = bytearray(data[:end] + table + data[end:])
+    struct.pack_into('>H', patched, segment + 2, length + len(table))
+    struct.pack_into(order + 'I', patched, tiff + 4,
+                     end + len(padding) - tiff)
+    return bytes(patched)
 
 
 class Camera:
@@ -58,50 +161,140 @@ class Camera:
         self._cap = None
         self._template = TemplateModule(self._cfg)
 
+        self._metrics = Metrics(self._cfg.getBool('Metrics', 'enable'),
+                                self._cfg.getInt('Metrics', 'window'),
+                                self._cfg.getFloat('Metrics', 'report_interval'))
+        self._template.metrics = self._metrics
+
         self._is_preview = self._cfg.getBool('Photobooth', 'show_preview')
         self._is_keep_pictures = self._cfg.getBool('Storage', 'keep_pictures')
 
+        preview_fps = self._cfg.getFloat('Photobooth', 'preview_fps')
+        self._previewInterval = 1 / preview_fps if preview_fps > 0 else 0
+
         rot_vals = {0: None, 90: Image.ROTATE_90, 180: Image.ROTATE_180,
                     270: Image.ROTATE_270}
         self._rotation = rot_vals[self._cfg.getInt('Camera', 'rotation')]
+        self._orientation = exif_orientations[self._rotation]
+
+        if self._cfg.getBool('Camera', 'cache_geometry'):
+            cache_dir = os.environ.get('XDG_CACHE_HOME',
+                                       os.path.expanduser('~/.cache'))
+            self._geometryCache = os.path.join(cache_dir, 'photobooth',
+                                               'camera.json')
+        else:
+            self._geometryCache = None
 
     def startup(self):
 
         self._cap = self._cam()
+        self._cap.metrics = self._metrics
+        self._cap.configure(self._cfg)
 
         logging.info('Using camera {} preview functionality'.format(
             'with' if self._is_preview else 'without'))
 
+        geometry_key = self._geometryKey()
+        geometry = self._loadGeometry(geometry_key)
+        if geometry is None:
+            geometry = self._measureGeometry()
+            self._storeGeometry(geometry_key, geometry)
+        else:
+            logging.info('Using cached picture and preview size')
+        self._pictureCaptureSize, self._previewCaptureSize = geometry
+        logging.info('Picture size: {}'.format(self._pictureCaptureSize))
+
+        self._previewDisplaySize = self._computePreviewDimensions(self._previewCaptureSize)
+        logging.info('Preview size: {} -> {}'.format(self._previewCaptureSize, self._previewDisplaySize))
+
+        # Previews are resized before rotating, i.e., in camera orientation
+        if self._rotation in (Image.ROTATE_90, Image.ROTATE_270):
+            self._previewResizeSize = self._previewDisplaySize[::-1]
+        else:
+            self._previewResizeSize = self._previewDisplaySize
+        self._previewTransposition = preview_transpositions[self._rotation]
+        self._is_preview = self._is_preview and self._cap.hasPreview
+
+        # Initialize template with size of test picture
+        self._template.startup(self._pictureCaptureSize)
+
+        # starting up and passing total number of pictures to make it available in overall context for later states
+        self._comm.send(Workers.MASTER, StateMachine.CameraEvent('ready', num_shots=self._template.totalNumPics))
+
+    def _measureGeometry(self):
+
         # Take a test picture to determine size of pictures taken
         self.setIdle()
         test_picture = self._cap.getPicture()
         if self._rotation is not None:
             test_picture = test_picture.transpose(self._rotation)
-        self._pictureCaptureSize = test_picture.size
-        logging.info('Picture size: {}'.format(self._pictureCaptureSize))
+        picture_size = test_picture.size
 
         # Take a test preview picture to determine size of previews taken
         self.setIdle()
         test_picture = self._cap.getPreview()
         if self._rotation is not None:
             test_picture = test_picture.transpose(self._rotation)
-        self._previewCaptureSize = test_picture.size
+        preview_size = test_picture.size
 
-        self._previewDisplaySize = self._computePreviewDimensions(self._previewCaptureSize)
-        logging.info('Preview size: {} -> {}'.format(self._previewCaptureSize, self._previewDisplaySize))
-        self._is_preview = self._is_preview and self._cap.hasPreview
+        return picture_size, preview_size
 
-        # Initialize template with size of test picture
-        self._template.startup(self._pictureCaptureSize)
+    def _geometryKey(self):
 
-        # starting up and passing total number of pictures to make it available in overall context for later states
-        self._comm.send(Workers.MASTER, StateMachine.CameraEvent('ready', num_shots=self._template.totalNumPics))
+        if self._geometryCache is None:
+            return None
+
+        probe = self._cap.probe()
+        if probe is None:
+            return None
+
+        return '{} / {} / {}'.format(self._cfg.get('Camera', 'module'), probe,
+                                     self._cfg.getInt('Camera', 'rotation'))
+
+    def _loadGeometry(self, key: str or None):
+
+        if key is None:
+            return None
+
+        try:
+            with open(self._geometryCache, 'r') as f:
+                geometry = json.load(f)[key]
+            return tuple(geometry['picture']), tuple(geometry['preview'])
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def _storeGeometry(self, key: str or None, geometry: tuple):
+
+        if key is None:
+            return
+
+        try:
+            with open(self._geometryCache, 'r') as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            cache = {}
+
+        cache[key] = {'picture': geometry[0], 'preview': geometry[1]}
+        try:
+            os.makedirs(os.path.dirname(self._geometryCache), exist_ok=True)
+            with open(self._geometryCache, 'w') as f:
+                json.dump(cache, f, indent=2)
+        except OSError as e:
+            logging.warning('Cannot cache camera geometry: {}'.format(e))
 
     def teardown(self, state: StateMachine.State):
 
         if self._cap is not None:
             self._cap.cleanup()
 
+        self._metrics.dump(self._cfg.get('Metrics', 'file'))
+
+    def reportMetrics(self):
+
+        if self._metrics.due():
+            self._comm.send(Workers.MASTER, StateMachine.MetricsEvent(
+                'Camera', self._metrics.summary()))
+
     def run(self):
 
         for state in self._comm.iter(Workers.CAMERA):
@@ -140,7 +333,7 @@ class Camera:
     def prepareCapture(self):
 
         self.setActive()
-        self._pictures = []
+        self._template.beginAssembly()
 
     def _computePreviewDimensions(self, size: tuple[int, int]):
 
@@ -161,30 +354,65 @@ class Camera:
         if self._is_preview:
             self.setIdle()
             while self._comm.empty(Workers.CAMERA):
-                picture = self._cap.getPreview()
-                if self._rotation is not None:
-                    picture = picture.transpose(self._rotation)
-                picture = picture.resize(self._previewDisplaySize, resample=Image.BOX)
-                picture = ImageOps.mirror(picture)
-                byte_data = BytesIO()
-                picture.save(byte_data, format='jpeg')
-                self._comm.send(Workers.GUI,
-                                StateMachine.CameraEvent('preview', shot=byte_data))
+                start = monotonic()
+                with self._metrics.stage('preview.capture'):
+                    picture = self._cap.getPreview()
+                with self._metrics.stage('preview.transform'):
+                    picture = self.transformPreview(picture,
+                                                    self._previewResizeSize,
+                                                    self._previewTransposition)
+                with self._metrics.stage('preview.send'):
+                    self.sendPreview(picture)
+                self.reportMetrics()
+
+                # Don't get ahead of the gui: wait until it took the frame, but
+                # keep grabbing (and overwriting) frames should it be too busy
+                self._comm.wait(Workers.GUI, max(self._previewInterval, 0.1))
+                remaining = self._previewInterval - (monotonic() - start)
+                if remaining > 0:
+                    sleep(remaining)
+
+    @staticmethod
+    def transformPreview(picture: Image.Image, size: tuple[int, int],
+                         transposition: int) -> Image.Image:
+
+        # JPEG previews are decoded at reduced size right away, the remaining
+        # downscaling happens before rotating and mirroring in one go. Camera
+        # modules hand out a new image per preview, as draft changes it
+        picture.draft('RGB', size)
+        picture = picture.resize(size, resample=Image.BOX)
+        return picture.transpose(transposition)
+
+    def sendPreview(self, picture: Image.Image):
+
+        ring = self._comm.previewRing
+        if ring is not None and ring.fits(picture.size):
+            # Hand over raw frame via shared memory, only the slot goes through the queue
+            frame = ring.write(picture.convert('RGB').tobytes(), picture.size)
+            self._comm.post(Workers.GUI,
+                            StateMachine.CameraEvent('preview', frame=frame))
+        else:
+            byte_data = BytesIO()
+            picture.save(byte_data, format='jpeg')
+            self._comm.send(Workers.GUI,
+                            StateMachine.CameraEvent('preview', shot=byte_data))
 
     def capturePicture(self, state: StateMachine.State):
 
-        self.setIdle()
-        picture = self._cap.getPicture()
-        if self._rotation is not None:
-            picture = picture.transpose(self._rotation)
-        byte_data = BytesIO()
-        picture.save(byte_data, format='jpeg')
-        self._pictures.append(byte_data)
-        self.setActive()
+        if self._template.burst is not None:
+            self.captureBurst(state)
+            return
 
-        if self._is_keep_pictures:
-            self._comm.send(Workers.WORKER,
-                            StateMachine.CameraEvent('capture', shot=byte_data))
+        if not self._template.hasShots(state.num_picture - 1):
+            self.abortCapture()
+            return
+
+        self.setIdle()
+        with self._metrics.stage('picture.trigger'):
+            shot = self._orientAsync(self._cap.getPictureAsync())
+        # Download, decode and resize the shot in the background during
+        # next countdown, which is started before any further camera call
+        self._template.addShot(state.num_picture - 1, shot)
 
         if state.num_picture < self._template.totalNumPics:
             self._comm.send(Workers.MASTER,
@@ -193,13 +421,103 @@ class Camera:
             self._comm.send(Workers.MASTER,
                             StateMachine.CameraEvent('assemble'))
 
+        self.setActive()
+        if self._is_keep_pictures:
+            shot.add_done_callback(self._keepShot)
+        self.reportMetrics()
+
+    def captureBurst(self, state: StateMachine.State):
+
+        num_frames, interval, source = self._template.burst
+        if source == 'preview' and self._cap.hasPreview:
+            grab = self._cap.getPreview
+        else:
+            self.setIdle()
+            grab = self._cap.getPictureBytes
+
+        # Frames are grabbed at a fixed rate and resized in the background
+        start = monotonic()
+        for i in range(num_frames):
+            frame = grab()
+            if isinstance(frame, Image.Image):
+                if self._rotation is not None:
+                    frame = frame.transpose(self._rotation)
+            else:
+                frame = self.orientShot(frame)
+            self._template.addShot(i, frame)
+
+            remaining = start + (i + 1) * interval - monotonic()
+            if remaining > 0:
+                sleep(remaining)
+
+        self.setActive()
+        self._comm.send(Workers.MASTER, StateMachine.CameraEvent('assemble'))
+
+    def _orientAsync(self, future: Future) -> Future:
+
+        oriented = Future()
+
+        def orient(future):
+            try:
+                oriented.set_result(self.orientShot(future.result()))
+            except BaseException as e:
+                oriented.set_exception(e)
+
+        future.add_done_callback(orient)
+        return oriented
+
+    def _keepShot(self, future: Future):
+
+        # Failed downloads surface when assembling the picture
+        if future.exception() is None:
+            with self._metrics.stage('picture.send'):
+                self._comm.send(Workers.WORKER, StateMachine.CameraEvent(
+                    'capture', shot=self._share(future.result())))
+
+    def orientShot(self, byte_data: BytesIO) -> BytesIO:
+
+        # Keep JPEG shots as taken by the camera and only tag their
+        # orientation, templates apply it when decoding
+        with self._metrics.stage('picture.rotate'):
+            data = setJpegOrientation(byte_data.getvalue(), self._orientation)
+            if data is not None:
+                return BytesIO(data)
+
+            # Other formats are rotated and re-encoded in their format
+            if self._rotation is None:
+                return byte_data
+            picture = Image.open(byte_data)
+            rotated = BytesIO()
+            picture.transpose(self._rotation).save(rotated,
+                                                   format=picture.format)
+            return rotated
+
+    def abortCapture(self):
+
+        logging.warning('Previous shots are missing, aborting capture')
+        self._comm.send(Workers.MASTER, StateMachine.CameraEvent('abort'))
+
     def assemblePicture(self):
 
+        if not self._template.hasShots(self._template.totalNumPics):
+            self.abortCapture()
+            return
+
         self.setIdle()
 
-        # assemble pictures based on template
-        picture = self._template.assemblePicture(self._pictures)
+        # compose prepared shots based on template
+        with self._metrics.stage('assemble'):
+            picture = self._template.finish()
+
+        with self._metrics.stage('assemble.send'):
+            self._comm.send(Workers.MASTER, StateMachine.CameraEvent(
+                'review', self._share(picture)))
+        self.reportMetrics()
 
-        self._comm.send(Workers.MASTER,
-                        StateMachine.CameraEvent('review', picture))
-        self._pictures = []
+    def _share(self, data: BytesIO or Picture):
+
+        # Pass large buffers as handles to the blob store instead of bytes
+        if isinstance(data, Picture):
+            return self._comm.blobs.putEach(data)
+        else:
+            return self._comm.blobs.put(data)
@@ -17,7 +17,7 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program. If not, see <http://www.gnu.org/licenses/>.
 
-from photobooth.Threading import Communicator
+from photobooth.Threading import Communicator, MailboxNotification, Workers
 from .. import StateMachine
 
 
@@ -98,6 +98,11 @@ class GuiSkeleton:
 
     def handleState(self, state):
 
+        if isinstance(state, MailboxNotification):
+            state = self._comm.take(Workers.GUI)
+            if state is None:
+                return
+
         if isinstance(state, StateMachine.CameraEvent):
             self.updatePreview(state)
         elif isinstance(state, StateMachine.GuiEvent):
@@ -65,6 +65,9 @@ class PyQtGui(GuiSkeleton):
 
         self._cfg = config
 
+        # Timed transitions are sent by the master instead, if enabled
+        self._is_timed_by_master = config.getBool('Photobooth', 'master_timers')
+
         self._initUI(argv)
         self._initReceiver()
         self._initWorker()
@@ -162,6 +165,19 @@ class PyQtGui(GuiSkeleton):
         self._timerViewSlides = QtCore.QTimer()
         self._timerViewSlides.timeout.connect(lambda: self._comm.send(Workers.GUI, GuiEvent('updateslideshow')))
 
+    def _startSlideshowTimer(self, slideshow_time: int):
+
+        if not self._is_timed_by_master:
+            self._timerStartSlideshow.setSingleShot(True)
+            self._timerStartSlideshow.start(slideshow_time)
+
+    def _resetSlideshowTimer(self, slideshow_time: int):
+
+        if self._is_timed_by_master:
+            self._comm.send(Workers.MASTER, GuiEvent('activity'))
+        else:
+            self._startSlideshowTimer(slideshow_time)
+
     def _destroyTimer(self):
         
          QtCore.QObject.killTimer(self, self._timerStartSlideshow)
@@ -266,8 +282,7 @@ class PyQtGui(GuiSkeleton):
             lambda: self._comm.send(Workers.MASTER, GuiEvent('trigger')), 
             lambda: self._comm.send(Workers.MASTER, GuiEvent('gallery'))))
         
-        self._timerStartSlideshow.setSingleShot(True)
-        self._timerStartSlideshow.start(slideshow_time)
+        self._startSlideshowTimer(slideshow_time)
     
     def showSlideshow(self, state: SlideshowState):
 
@@ -301,8 +316,7 @@ class PyQtGui(GuiSkeleton):
 
         slideshow_time = self._cfg.getInt('Slideshow', 'start_slideshow_time') * 1000
 
-        self._timerStartSlideshow.setSingleShot(True)
-        self._timerStartSlideshow.start(slideshow_time)
+        self._startSlideshowTimer(slideshow_time)
 
         if not isinstance(self._gui.centralWidget(), Frames.GalleryMessage):
             self._setWidget(Frames.GalleryMessage(self._pictureList, self._cfg.getInt("Gallery", "columns"),
@@ -320,8 +334,7 @@ class PyQtGui(GuiSkeleton):
             "link": os.path.join(self._cfg.get('UploadS3', 'bucket'), self._cfg.get('UploadS3', 'basepath'))
         }
 
-        self._timerStartSlideshow.setSingleShot(True)
-        self._timerStartSlideshow.start(slideshow_time)
+        self._startSlideshowTimer(slideshow_time)
 
         if state.action is None:
             items = self._postprocess.getAllItems()
@@ -330,7 +343,7 @@ class PyQtGui(GuiSkeleton):
                 self._gui.centralWidget(), self._pictureList, items, self._worker, state.pictureRef, uploads3,
                 lambda x: self._comm.send(Workers.MASTER, GuiEvent('postprocess', pictureRef=state.pictureRef, postprocessAction=x)),
                 lambda: self._comm.send(Workers.MASTER, GuiEvent('close')),
-                lambda x: self._timerStartSlideshow.start(slideshow_time))
+                lambda x: self._resetSlideshowTimer(slideshow_time))
         else:
             logging.info('Skip Reinitializing Gallery Select')
       
@@ -347,19 +360,29 @@ class PyQtGui(GuiSkeleton):
             self._setWidget(Frames.GreeterMessage(
                 num_pics,
                 lambda: self._comm.send(Workers.MASTER, GuiEvent('countdown'))))
-        QtCore.QTimer.singleShot(
-            greeter_time,
-            lambda: self._comm.send(Workers.MASTER, GuiEvent('countdown')))
+        if not self._is_timed_by_master:
+            QtCore.QTimer.singleShot(
+                greeter_time,
+                lambda: self._comm.send(Workers.MASTER, GuiEvent('countdown')))
 
     def showCountdown(self, state: CountdownState):
 
         countdown_time = self._cfg.getInt('Photobooth', 'countdown_time')
-        self._setWidget(Frames.CountdownMessage(
-            countdown_time,
-            lambda: self._comm.send(Workers.MASTER, GuiEvent('capture'))))
+        if self._is_timed_by_master:
+            action = lambda: None
+        else:
+            action = lambda: self._comm.send(Workers.MASTER, GuiEvent('capture'))
+        self._setWidget(Frames.CountdownMessage(countdown_time, action))
 
     def updatePreview(self, event: CameraEvent):
-        shot = Image.open(event.shot)
+        if event.frame is not None:
+            data = self._comm.previewRing.read(event.frame)
+            if data is None:
+                # Frame has been overwritten already, a newer one is on its way
+                return
+            shot = Image.frombytes('RGB', event.frame.size, data)
+        else:
+            shot = Image.open(event.shot)
         self._gui.centralWidget().picture = ImageQt.ImageQt(shot)
         self._gui.centralWidget().update()
 
@@ -373,14 +396,19 @@ class PyQtGui(GuiSkeleton):
 
     def showReview(self, state: ReviewState):
 
-        picture = Image.open(state.picture.original)
+        try:
+            picture = Image.open(self._comm.blobs.load(state.picture.original))
+            picture.load()
+        finally:
+            self._comm.blobs.release(state.picture)
         self._picture = ImageQt.ImageQt(picture)
         self._pictureList.findExistingFiles()
         review_time = self._cfg.getInt('Photobooth', 'display_time') * 1000
         self._setWidget(Frames.PictureMessage(self._picture))
-        QtCore.QTimer.singleShot(
-            review_time,
-            lambda: self._comm.send(Workers.MASTER, GuiEvent('postprocess')))
+        if not self._is_timed_by_master:
+            QtCore.QTimer.singleShot(
+                review_time,
+                lambda: self._comm.send(Workers.MASTER, GuiEvent('postprocess')))
 
     def showPostprocess(self, state: PostprocessState):
 
@@ -398,7 +426,7 @@ class PyQtGui(GuiSkeleton):
             self._gui.centralWidget(), self._pictureList, items, self._worker, uploads3,
             lambda x: self._comm.send(Workers.MASTER, GuiEvent('postprocess', pictureRef=self._pictureList.getLast(), postprocessAction=x)),
             lambda: self._comm.send(Workers.MASTER, GuiEvent('idle')),
-            postproc_t * 1000)
+            None if self._is_timed_by_master else postproc_t * 1000)
 
     def _handleKeypressEvent(self, event: Event):
 
@@ -48,5 +48,7 @@ class Receiver(QtCore.QThread):
 
     def run(self):
 
-        for state in self._comm.iter(Workers.GUI):
+        # Posted preview frames are taken by the gui thread when it handles
+        # the notification, so the camera waits for a busy gui
+        for state in self._comm.iter(Workers.GUI, take_posted=False):
             self.handle(state)
@@ -21,7 +21,6 @@ import math
 import os
 import logging
 from typing import Callable
-import qrcode
 
 from photobooth.worker.PictureList import PictureList, PictureRef
 
@@ -369,6 +368,9 @@ class UploadS3Overlay(QtWidgets.QWidget):
         super().__init__(parent)
         self.setObjectName('UploadS3Overlay')
 
+        # Only needed with S3 uploads enabled, so imported on first use
+        import qrcode
+
         img = qrcode.make(qr_data, version=3)
         qim = ImageQt.ImageQt(img)
         self._pix = QtGui.QPixmap.fromImage(qim)
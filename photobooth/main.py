@@ -21,19 +21,26 @@
 __version__ = 'unknown'
 
 import argparse
+import asyncio
 import gettext
 import logging
 import logging.handlers
 import multiprocessing as mp
+import threading
+from time import monotonic
+from typing import NamedTuple
 
-from . import camera, gui, template
 from .Config import Config
-from .gpio import Gpio
-from .web import Web
 from .util import lookup_and_import
-from .StateMachine import Context, ErrorEvent
-from .Threading import Communicator, Workers
+# The worker package imports the state machine, which in turn needs the
+# picture types of the worker package, so it has to be imported first
 from .worker import Worker
+from .StateMachine import (Context, CountdownState, ErrorEvent, GalleryState,
+                           GallerySelectState, GreeterState, GuiEvent,
+                           IdleState, PostprocessState, ReviewState,
+                           StartupState, TeardownEvent, TeardownState,
+                           WelcomeState)
+from .Threading import BlobStore, Communicator, FrameRing, Workers
 
 # Globally install gettext for I18N
 gettext.install('photobooth', 'photobooth/locale')
@@ -41,6 +48,15 @@ gettext.install('photobooth', 'photobooth/locale')
 
 class CameraProcess(mp.Process):
 
+    worker = Workers.CAMERA
+
+    # State types and payload fields this process needs
+    subscriptions = ()
+
+    # Config sections this process reads, changing any restarts it
+    config_sections = ('Camera', 'Photobooth', 'Template', 'Burst', 'Picture',
+                       'Gallery', 'Storage', 'Metrics')
+
     def __init__(self, argv, config: Config, comm: Communicator):
 
         super().__init__()
@@ -48,11 +64,17 @@ class CameraProcess(mp.Process):
 
         self._cfg = config
         self._comm = comm
+        self._log_level = logging.getLogger().level
 
     def run(self):
 
+        setupLogging(self._log_level)
         logging.debug('CameraProcess: Initializing...')
 
+        # Subsystems are imported by their process only, which keeps the
+        # master and the other processes from loading their dependencies
+        from . import camera, template
+
         TemplateModule = lookup_and_import(
             template.modules, self._cfg.get('Template', 'module'), 'template')
         CameraModule = lookup_and_import(
@@ -73,6 +95,13 @@ class CameraProcess(mp.Process):
 
 class GuiProcess(mp.Process):
 
+    worker = Workers.GUI
+
+    subscriptions = ((ReviewState, ('picture', )), )
+
+    config_sections = ('Event', 'Gui', 'Photobooth', 'Printer', 'Slideshow',
+                       'Gallery', 'Storage', 'UploadS3', 'System')
+
     def __init__(self, argv, config: Config, comm: Communicator):
 
         super().__init__()
@@ -80,10 +109,13 @@ class GuiProcess(mp.Process):
         self._argv = argv
         self._cfg = config
         self._comm = comm
+        self._log_level = logging.getLogger().level
 
     def run(self):
 
+        setupLogging(self._log_level)
         logging.debug('GuiProcess: Initializing...')
+        from . import gui
         Gui = lookup_and_import(gui.modules, self._cfg.get('Gui', 'module'),
                                 'gui')
         logging.debug('GuiProcess: Running...')
@@ -94,6 +126,13 @@ class GuiProcess(mp.Process):
 
 class WorkerProcess(mp.Process):
 
+    worker = Workers.WORKER
+
+    subscriptions = ((ReviewState, ('picture', )), )
+
+    config_sections = ('Storage', 'Printer', 'Mailer', 'UploadWebdav',
+                       'UploadS3')
+
     def __init__(self, argv, config: Config, comm: Communicator):
 
         super().__init__()
@@ -101,9 +140,11 @@ class WorkerProcess(mp.Process):
 
         self._cfg = config
         self._comm = comm
+        self._log_level = logging.getLogger().level
 
     def run(self):
 
+        setupLogging(self._log_level)
         logging.debug('WorkerProcess: Initializing...')
 
         while True:
@@ -120,6 +161,10 @@ class WorkerProcess(mp.Process):
 
 class GpioProcess(mp.Process):
 
+    worker = Workers.GPIO
+    subscriptions = ()
+    config_sections = ('Gpio', )
+
     def __init__(self, argv, config: Config, comm: Communicator):
 
         super().__init__()
@@ -127,10 +172,13 @@ class GpioProcess(mp.Process):
 
         self._cfg = config
         self._comm = comm
+        self._log_level = logging.getLogger().level
 
     def run(self):
 
+        setupLogging(self._log_level)
         logging.debug('GpioProcess: Initializing...')
+        from .gpio import Gpio
 
         while True:
             try:
@@ -146,6 +194,10 @@ class GpioProcess(mp.Process):
 
 class WebProcess(mp.Process):
 
+    worker = Workers.WEB
+    subscriptions = ()
+    config_sections = ('Event', 'Storage', 'Web')
+
     def __init__(self, argv, config: Config, comm: Communicator):
 
         super().__init__()
@@ -153,10 +205,13 @@ class WebProcess(mp.Process):
 
         self._cfg = config
         self._comm = comm
+        self._log_level = logging.getLogger().level
 
     def run(self):
 
+        setupLogging(self._log_level)
         logging.debug('WebProcess: Initializing...')
+        from .web import Web
 
         while True:
             try:
@@ -170,6 +225,169 @@ class WebProcess(mp.Process):
         logging.debug('WebProcess: Exit')
 
 
+class Supervisor:
+    """Start the processes and restart them individually.
+
+    A process exiting with a non-zero exit code is restarted after a delay
+    that doubles with every crash, and re-synced to the current state.
+    Changed settings restart only the processes reading changed sections.
+    """
+
+    # Config sections read by the master itself, changing them requires a
+    # restart of the whole application
+    master_sections = ('Gui', 'Metrics', 'Photobooth', 'Slideshow', 'System')
+
+    class Restart(NamedTuple):
+
+        worker: Workers
+
+    def __init__(self, argv, config: Config, comm: Communicator,
+                 context: Context, proc_classes: list[type]):
+
+        super().__init__()
+
+        self._argv = argv
+        self._cfg = config
+        self._comm = comm
+        self._context = context
+
+        self._classes = {P.worker: P for P in proc_classes}
+        self._procs = {}
+        self._started = {}
+        self._failures = {worker: 0 for worker in self._classes}
+        self._pending = set()
+        self._lock = threading.Lock()
+
+        self._is_enabled = config.getBool('System', 'supervise')
+        self._delay = config.getFloat('System', 'restart_delay')
+        self._delay_max = config.getFloat('System', 'restart_delay_max')
+
+        self._stopped = threading.Event()
+        self._monitor = threading.Thread(target=self.monitor, daemon=True)
+
+    @property
+    def procs(self) -> list[mp.Process]:
+
+        return list(self._procs.values())
+
+    def start(self):
+
+        for worker in self._classes:
+            self.spawn(worker)
+
+        if self._is_enabled:
+            self._monitor.start()
+
+    def stop(self):
+
+        self._stopped.set()
+
+    def spawn(self, worker: Workers):
+
+        proc = self._classes[worker](self._argv, self._cfg, self._comm)
+        proc.start()
+        self._procs[worker] = proc
+        self._started[worker] = monotonic()
+
+    def monitor(self):
+
+        while not self._stopped.wait(0.5):
+            with self._lock:
+                self._check()
+
+    def _check(self):
+
+        # Processes being replaced are never seen here, as the lock is held
+        # until their successors are running
+        for worker, proc in self._procs.items():
+            if (worker in self._pending or proc.is_alive()
+                    or proc.exitcode in (None, 0)):
+                continue
+
+            # Processes running long enough before crashing start over
+            # with the shortest delay
+            if monotonic() - self._started[worker] > self._delay_max:
+                self._failures[worker] = 0
+            delay = min(self._delay * 2**self._failures[worker],
+                        self._delay_max)
+            self._failures[worker] += 1
+
+            logging.error(('Supervisor: %s exited with code %d, '
+                           'restarting in %.1fs'),
+                          worker.name, proc.exitcode, delay)
+
+            # The restart is handed to the main loop to serialize it with
+            # state changes
+            self._pending.add(worker)
+            timer = threading.Timer(delay, self._comm.send,
+                                    (Workers.MASTER, self.Restart(worker)))
+            timer.daemon = True
+            timer.start()
+
+    def restart(self, worker: Workers):
+
+        if self._stopped.is_set():
+            return
+
+        with self._lock:
+            logging.info('Supervisor: Restarting %s', worker.name)
+            self.terminate(worker)
+            self.spawn(worker)
+
+            # Bring the process up to date, a camera needs to be started up
+            # again before it can follow the current state
+            state = self._context.state
+            if (worker == Workers.CAMERA and self._context.is_running
+                    and not isinstance(state, StartupState)):
+                self._comm.deliver(worker, StartupState())
+            self._comm.deliver(worker, state)
+
+            self._pending.discard(worker)
+
+    def terminate(self, worker: Workers):
+
+        proc = self._procs[worker]
+        if proc.is_alive():
+            self._comm.deliver(worker, TeardownState(TeardownEvent.RESTART))
+            self._comm.send(worker, None)
+            proc.join(5)
+        if proc.is_alive():
+            logging.warning('Supervisor: Terminating %s', worker.name)
+            proc.terminate()
+        proc.join()
+
+        self._comm.reset(worker)
+
+    def reconfigure(self) -> bool:
+        """Restart only the processes affected by changed settings.
+
+        Returns False if the whole application must be restarted instead.
+        """
+
+        config = Config(self._cfg.filename)
+        changed = self._cfg.diff(config)
+        workers = [worker for worker, P in self._classes.items()
+                   if changed & set(P.config_sections)]
+
+        if changed & set(self.master_sections) or Workers.GUI in workers:
+            return False
+
+        logging.info('Supervisor: Changed settings %s, restarting %s',
+                     ', '.join(sorted(changed)) or 'none',
+                     ', '.join(worker.name for worker in workers) or 'none')
+
+        with self._lock:
+            self._cfg = config
+            for worker in workers:
+                self.terminate(worker)
+                self.spawn(worker)
+
+        # The settings are left towards the welcome screen
+        self._context.is_running = False
+        self._context.state = WelcomeState()
+        return True
+
+
 def parseArgs(argv):
 
     # Add parameter for direct startup
@@ -181,12 +399,88 @@ def parseArgs(argv):
     return parser.parse_known_args()
 
 
-def mainloop(comm: Communicator, context: Context):
+class Timers:
+    """Timed state transitions, run by the master's event loop.
+
+    Every state with a timer gets the event the gui would send after the
+    configured time, unless the state has changed meanwhile.
+    """
+
+    def __init__(self, config: Config):
+
+        super().__init__()
+
+        slideshow = ('slideshow', config.getInt('Slideshow', 'start_slideshow_time'))
+        self._timers = {
+            GreeterState: ('countdown', config.getInt('Photobooth', 'greeter_time')),
+            CountdownState: ('capture', config.getInt('Photobooth', 'countdown_time')),
+            ReviewState: ('postprocess', config.getInt('Photobooth', 'display_time')),
+            PostprocessState: ('idle', config.getInt('Photobooth', 'postprocess_time')),
+            IdleState: slideshow,
+            GalleryState: slideshow,
+            GallerySelectState: slideshow}
+
+        self._state = None
+        self._handle = None
+
+    def update(self, loop: asyncio.AbstractEventLoop, comm: Communicator,
+               context: Context):
+
+        state = context.state
+        if state is self._state:
+            return
+
+        self._state = state
+        self.rearm(loop, comm, context)
+
+    def rearm(self, loop: asyncio.AbstractEventLoop, comm: Communicator,
+              context: Context):
+
+        # Restarts the timer of the current state, e.g., on user activity
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+
+        timer = self._timers.get(type(self._state))
+        if timer is not None:
+            name, delay = timer
+            self._handle = loop.call_later(delay, self.fire, loop, comm,
+                                           context, self._state, name)
+
+    def fire(self, loop: asyncio.AbstractEventLoop, comm: Communicator,
+             context: Context, state, name: str):
+
+        self._handle = None
+        if context.state is not state:
+            return
+
+        try:
+            context.handleEvent(GuiEvent(name))
+        except Exception as e:
+            logging.exception('Main: Exception "{}"'.format(e))
+            comm.send(Workers.MASTER, ErrorEvent('MainLoop', str(e)))
+
+        self.update(loop, comm, context)
+
+
+def dispatch(event, context: Context, supervisor: Supervisor) -> int or None:
+
+    if isinstance(event, Supervisor.Restart):
+        supervisor.restart(event.worker)
+    elif (isinstance(event, TeardownEvent)
+            and event.target == TeardownEvent.RESTART
+            and supervisor.reconfigure()):
+        pass
+    else:
+        return context.handleEvent(event)
+
+
+def mainloop(comm: Communicator, context: Context, supervisor: Supervisor):
 
     while True:
         try:
             for event in comm.iter(Workers.MASTER):
-                    exit_code = context.handleEvent(event)
+                    exit_code = dispatch(event, context, supervisor)
                     if exit_code in (0, 123):
                         return exit_code
         except Exception as e:
@@ -194,6 +488,33 @@ def mainloop(comm: Communicator, context: Context):
             comm.send(Workers.MASTER, ErrorEvent('MainLoop', str(e)))
 
 
+async def asyncMainloop(comm: Communicator, context: Context,
+                        supervisor: Supervisor, timers: Timers):
+
+    # Events are received in an executor thread, which leaves the loop free
+    # to run the timers meanwhile
+    loop = asyncio.get_running_loop()
+    timers.update(loop, comm, context)
+
+    while True:
+        try:
+            event = await loop.run_in_executor(None, comm.recv, Workers.MASTER)
+            if event is None:
+                continue
+            if isinstance(event, GuiEvent) and event.name == 'activity':
+                timers.rearm(loop, comm, context)
+                continue
+
+            exit_code = dispatch(event, context, supervisor)
+            if exit_code in (0, 123):
+                return exit_code
+        except Exception as e:
+            logging.exception('Main: Exception "{}"'.format(e))
+            comm.send(Workers.MASTER, ErrorEvent('MainLoop', str(e)))
+
+        timers.update(loop, comm, context)
+
+
 def run(argv, is_run):
 
     # Load configuration
@@ -202,45 +523,78 @@ def run(argv, is_run):
     __version__ = config.get('System', 'version')
     logging.info('Photobooth version: %s', __version__)
 
-    comm = Communicator()
-    context = Context(comm, is_run)
-
-    # Initialize processes: We use 6 processes here:
-    # 1. Master that collects events and distributes state changes
-    # 2. Camera handling
-    # 3. GUI
-    # 4. Postprocessing worker
-    # 5. GPIO handler
-    # 6. Web server
-    proc_classes = (CameraProcess, WorkerProcess, GuiProcess, GpioProcess, WebProcess)
-    procs = [P(argv, config, comm) for P in proc_classes]
-
-    for proc in procs:
-        proc.start()
-
-    # Enter main loop
-    exit_code = mainloop(comm, context)
-
-    # Wait for processes to finish
-    for proc in procs:
-        proc.join()
+    # Processes are forked from the master by default. A forkserver forks
+    # them from a server process instead, which has only the preloaded
+    # modules imported and starts them without copying the master
+    start_method = config.get('System', 'start_method')
+    if start_method == 'forkserver':
+        mp.set_forkserver_preload(
+            [module.strip() for module in config.get('System', 'preload').split(',')])
+    if start_method != 'default':
+        mp.set_start_method(start_method, force=True)
+
+    # Preview frames are handed from camera to gui via shared memory, which
+    # only requires slots large enough for frames fitting into the gui
+    preview_ring = FrameRing((config.getInt('Gui', 'width'),
+                              config.getInt('Gui', 'height')))
+
+    # Shared memory and blobs outlive the master unless removed, which
+    # also has to happen if it fails or is interrupted
+    blob_store = None
+    try:
+        # Pictures and shots are passed between processes as blob handles
+        blob_store = BlobStore()
+
+        comm = Communicator(preview_ring, blob_store,
+                            config.getBool('Metrics', 'instrument_queues'))
+        context = Context(comm, is_run)
+
+        # Initialize processes: We use 6 processes here:
+        # 1. Master that collects events and distributes state changes
+        # 2. Camera handling
+        # 3. GUI
+        # 4. Postprocessing worker
+        # 5. GPIO handler
+        # 6. Web server
+        proc_classes = (CameraProcess, WorkerProcess, GuiProcess, GpioProcess, WebProcess)
+        for P in proc_classes:
+            comm.subscribe(P.worker, P.subscriptions)
+        supervisor = Supervisor(argv, config, comm, context, proc_classes)
+        supervisor.start()
+
+        # Enter main loop, which runs the timed transitions if enabled
+        # instead of leaving them to the gui
+        if config.getBool('Photobooth', 'master_timers'):
+            exit_code = asyncio.run(asyncMainloop(comm, context, supervisor,
+                                                  Timers(config)))
+        else:
+            exit_code = mainloop(comm, context, supervisor)
+        supervisor.stop()
+
+        # Wait for processes to finish
+        for proc in supervisor.procs:
+            proc.join()
+    finally:
+        preview_ring.unlink()
+        if blob_store is not None:
+            blob_store.cleanup()
+
+    if comm.stats is not None:
+        logging.info('Queue statistics:\n{}'.format(
+            comm.stats.format(comm.stats.summary())))
 
     logging.debug('All processes joined, returning code {}'. format(exit_code))
 
     return exit_code
 
 
-def main(argv):
+def setupLogging(log_level: int):
 
-    # Parse command line arguments
-    parsed_args, unparsed_args = parseArgs(argv)
-    argv = argv[:1] + unparsed_args
+    # Processes not forked from the master (see start_method) set up their
+    # logging again, forked processes inherit it
+    if logging.getLogger().hasHandlers():
+        return
 
-    # Setup log level and format
-    if parsed_args.debug:
-        log_level = logging.DEBUG
-    else:
-        log_level = logging.INFO
     formatter = logging.Formatter(
         '%(asctime)s %(levelname)-8s [%(filename)s:%(lineno)d %(funcName)s]: %(message)s')
 
@@ -256,6 +610,19 @@ def main(argv):
     # Apply config
     logging.basicConfig(level=log_level, handlers=(ch, fh))
 
+
+def main(argv):
+
+    # Parse command line arguments
+    parsed_args, unparsed_args = parseArgs(argv)
+    argv = argv[:1] + unparsed_args
+
+    # Setup log level and format
+    if parsed_args.debug:
+        setupLogging(logging.DEBUG)
+    else:
+        setupLogging(logging.INFO)
+
     # Set of known status codes which trigger a restart of the application
     known_status_codes = {
         999: 'Initializing photobooth',
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import logging
+from io import BytesIO
+
+from PIL import Image, features
+
+from photobooth.Config import Config
+from photobooth.worker.PictureList import Picture, ShotRef
+
+from . import Template
+
+
+class BurstTemplate(Template):
+    """
+    Takes a burst of frames in a single capture and assembles them into an
+    animated GIF (and WebP if available) next to a still of the first frame.
+    """
+
+    def __init__(self, config: Config):
+
+        super().__init__(config)
+
+        logging.info('Using template "%s"', self)
+
+        self._totalNumPics = 1
+
+        self._numFrames = self._cfg.getInt('Burst', 'frames')
+        self._fps = self._cfg.getFloat('Burst', 'fps')
+        self._source = self._cfg.get('Burst', 'source')
+        self._size = self._cfg.getInt('Burst', 'size')
+        self._boomerang = self._cfg.getBool('Burst', 'boomerang')
+        self._colors = self._cfg.getInt('Burst', 'colors')
+
+        self._frameSize = None
+
+    @property
+    def burst(self):
+        ### Number of frames, interval and source of a burst
+        return self._numFrames, 1 / self._fps, self._source
+
+    def startup(self, capture_size: tuple[int, int]):
+
+        self._frameSize = self._fit(capture_size)
+        logging.info('Burst of %d frames of size %s',
+                     self._numFrames, self._frameSize)
+
+    def _fit(self, size: tuple[int, int]) -> tuple[int, int]:
+
+        scale = min(1, self._size / max(size))
+        return tuple(int(size[i] * scale) for i in range(2))
+
+    def prepareShot(self, n: int, frame: Image.Image or ShotRef):
+
+        # Frames are handed over as images (previews) or JPEGs (pictures).
+        # Previews have their own geometry, usually of another aspect ratio
+        if isinstance(frame, Image.Image):
+            size = self._fit(frame.size)
+        else:
+            size = self._frameSize
+            frame = self.openShot(frame, size)
+        return frame.convert('RGB').resize(size, Image.BILINEAR)
+
+    def composePicture(self, shots: dict) -> Picture:
+
+        logging.info('Assembling animation')
+
+        frames = [shots[n] for n in sorted(shots)]
+
+        # Quantize all frames against one palette, so GIF frames only
+        # differ in their pixels and can be delta-encoded
+        palette = self._palette(frames)
+        quantized = list(self._executor.map(
+            lambda frame: frame.quantize(palette=palette, dither=Image.NONE),
+            frames))
+
+        # Frames played backward are the same images, quantized only once
+        if self._boomerang:
+            frames += frames[-2:0:-1]
+            quantized += quantized[-2:0:-1]
+
+        duration = int(1000 / self._fps)
+        animation = self._executor.submit(self._encode, quantized, 'GIF',
+                                          duration=duration)
+        if features.check('webp'):
+            clip = self._executor.submit(self._encode, frames, 'WEBP',
+                                         duration=duration, method=0)
+        else:
+            clip = None
+
+        picture = self.renderVariants(frames[0])
+        return picture._replace(animation=animation.result(),
+                                clip=self._result(clip))
+
+    @staticmethod
+    def _result(clip) -> BytesIO or None:
+
+        # Pillow may be built with WebP but without support for animations
+        if clip is None:
+            return None
+        try:
+            return clip.result()
+        except (OSError, KeyError) as e:
+            logging.warning('Cannot encode animated WebP: {}'.format(e))
+            return None
+
+    def _palette(self, frames: list[Image.Image]) -> Image.Image:
+
+        # Compute the palette once from a mosaic of up to four frames
+        samples = frames[::max(1, len(frames) // 4)][:4]
+        width, height = samples[0].size
+        mosaic = Image.new('RGB', (width * len(samples), height))
+        for i, frame in enumerate(samples):
+            mosaic.paste(frame, (i * width, 0))
+        return mosaic.quantize(self._colors, method=Image.MEDIANCUT)
+
+    @staticmethod
+    def _encode(frames: list[Image.Image], format: str, **params) -> BytesIO:
+
+        byte_data = BytesIO()
+        frames[0].save(byte_data, format=format, save_all=True,
+                       append_images=frames[1:], loop=0, **params)
+        return byte_data
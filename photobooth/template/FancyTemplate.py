@@ -33,7 +33,8 @@ class AssemblyTask():
         target_aspect_ratio = size[0]/size[1]
         logging.info("Orig Size %s size %s",org_size,size)
 
-        img = image.copy()
+        # crop and resize return new images, no need to copy upfront
+        img = image
         if org_aspect_ratio < target_aspect_ratio:
             # image is narrow -> cut top and bottom
             size_ratio = org_size[0]/size[0]
@@ -52,6 +53,20 @@ class AssemblyTask():
         img = img.resize(size, resample=Image.BICUBIC)
         return img
 
+    @staticmethod
+    def composite(canvas, layer, position):
+        """
+        Alpha composite layer onto canvas at position, clipping the parts
+        placed off-canvas like paste does
+        """
+        left, top = position
+        box = (max(-left, 0), max(-top, 0),
+               min(layer.width, canvas.width - left),
+               min(layer.height, canvas.height - top))
+        if box[0] < box[2] and box[1] < box[3]:
+            canvas.alpha_composite(layer, dest=(left + box[0], top + box[1]),
+                                   source=box)
+
 
 class ImageAssemblyTask(AssemblyTask):
     def __init__(self, name, filename, position, size, rotate=0):
@@ -68,6 +83,9 @@ class ImageAssemblyTask(AssemblyTask):
     def do(self, image, photos=None):
         image.paste(self._img, self._position, self._img)
 
+    def flatten(self, canvas):
+        self.composite(canvas, self._img, self._position)
+
 
 class TextAssemblyTask(AssemblyTask):
     def __init__(self, name, text, position, size, color, font, rotate=0):
@@ -87,6 +105,26 @@ class TextAssemblyTask(AssemblyTask):
         # image = Image.alpha_composite(image, self._txt)
         image.paste(self._txt, self._position, self._txt)
 
+    def flatten(self, canvas):
+        self.composite(canvas, self._txt, self._position)
+
+
+class FlattenedAssemblyTask(AssemblyTask):
+    """
+    Consecutive static layers merged into one overlay at startup and
+    cropped to its non-transparent bounding box
+    """
+    def __init__(self, name, tasks, size):
+        self._name = name
+        canvas = Image.new('RGBA', size, (0, 0, 0, 0))
+        for task in tasks:
+            task.flatten(canvas)
+        self._overlay = Template.cropOverlay(canvas)
+
+    def do(self, image, photos=None):
+        if self._overlay is not None:
+            image.paste(*self._overlay)
+
 
 class PhotoAssemblyTask(AssemblyTask):
     def __init__(self, name, photoNr, position, size, rotate=0):
@@ -96,25 +134,40 @@ class PhotoAssemblyTask(AssemblyTask):
         self._size = size
         self._rotate = rotate
 
-    def do(self, image, photos):
-        logging.debug("Assembling photoNr=%d", self._photoNr)
-        photo = Image.open(photos[self._photoNr])
+    @property
+    def key(self):
+        # Placements with the same key look alike (the crop follows from the size)
+        return (self._photoNr, self._size, self._rotate)
+
+    def prepare(self, shot):
+        return self.transform(Template.openShot(shot, self._size))
+
+    def transform(self, photo):
+        logging.debug("Preparing photoNr=%d", self._photoNr)
         if self._size is not None:
             photo = self.resize(photo, self._size)
             #photo.thumbnail(self._size)
         if self._rotate != 0:
             photo = photo.convert('RGBA')
             photo = photo.rotate(self._rotate, resample=Image.BICUBIC, expand=True)
+        return photo
+
+    def paste(self, image, photo):
+        if self._rotate != 0:
             image.paste(photo, self._position, photo)
         else:
             image.paste(photo, self._position)
-            
+
+    def do(self, image, photos):
+        logging.debug("Assembling photoNr=%d", self._photoNr)
+        self.paste(image, self.prepare(photos[self._photoNr]))
+
+
 class FancyTemplate(Template):
 
     def __init__(self, config):
 
-        self._cfg = config
-        self._totalNumPics = 0
+        super().__init__(config)
         self._templateFile = self._cfg.get("Template", "template")
         self._templateFolder = os.path.dirname(self._templateFile)
         logging.debug("template file = %s", self._templateFile)
@@ -142,11 +195,12 @@ class FancyTemplate(Template):
                     position = step.get("position")
                     if position is None:
                         position = (0, 0)
+                    else:
+                        position = tuple(int(p) for p in position.split(","))
                     size = None  # Not implemented yet
 
                     iat = ImageAssemblyTask(name, filename, position, size)
                     assemblytasks.append(iat)
-                    # Optimization: if no other photo-tasks in queue yet, execute immediately
                 elif step.tag == "photo":
                     logging.debug("preparing photo")
                     # <photo id="left" shot="1" x="1" y="1" width="400" height="300" rotation="0"> </photo>
@@ -166,10 +220,39 @@ class FancyTemplate(Template):
         return assemblytasks
 
 
+    def _compile(self, assemblytasks):
+        """
+        Flatten static layers: the ones below all photos are pasted onto
+        the background once, consecutive ones above photos are merged
+        into a single cropped overlay.
+        """
+        compiled = []
+        static = []
+        for task in assemblytasks + [None]:
+            if isinstance(task, (ImageAssemblyTask, TextAssemblyTask)):
+                static.append(task)
+                continue
+
+            if len(compiled) == 0:
+                for layer in static:
+                    layer.do(self._back, None)
+            elif len(static) > 0:
+                compiled.append(FlattenedAssemblyTask(
+                    "+".join(layer._name or "" for layer in static),
+                    static, self._back.size))
+            static = []
+
+            if task is not None:
+                compiled.append(task)
+
+        logging.debug("Template: flattened %d assembly tasks into %d",
+                      len(assemblytasks), len(compiled))
+        return compiled
+
     def startup(self, capture_size):
         xmltemplate = self._templateFile
         logging.debug("xmltemplate = %s", xmltemplate)
-        self._assemblytasks = self._parseXMLTemplate(xmltemplate)
+        self._assemblytasks = self._compile(self._parseXMLTemplate(xmltemplate))
         # implement parser for JSON alternatively??
 
         # count required photo shots
@@ -177,24 +260,60 @@ class FancyTemplate(Template):
         logging.debug("Template: assembly tasks: %d, shots required: %s", len(self._assemblytasks), shots)
         self._totalNumPics = len(shots)
 
-
-    def assemblePicture(self, pictures):
+        # Plan the assembly: the distinct placements of each shot are prepared
+        # in parallel, only pasting in the order of the layers is serial
+        self._plan = {}
+        for task in self._assemblytasks:
+            if isinstance(task, PhotoAssemblyTask):
+                self._plan.setdefault(task._photoNr, {}).setdefault(task.key, task)
+
+        self._decodeSizes = {}
+        for n, tasks in self._plan.items():
+            sizes = [task._size for task in tasks.values()]
+            if any(size is None for size in sizes):
+                self._decodeSizes[n] = None
+            else:
+                self._decodeSizes[n] = tuple(max(size[i] for size in sizes)
+                                             for i in range(2))
+
+
+    def _decode(self, n, shot):
+        # Decode the shot once, large enough for all its placements
+        with self.metrics.stage('shot.wait'):
+            shot = Template.waitShot(shot)
+        with self.metrics.stage('shot.decode'):
+            photo = Template.openShot(shot, self._decodeSizes[n])
+            photo.load()
+        return photo
+
+    def _transform(self, task, decoded):
+        decoded = decoded.result()
+        with self.metrics.stage('shot.resize'):
+            return task.transform(decoded)
+
+    def addShot(self, n, shot):
+        # Crop, resize and rotate identical placements once, but distinct
+        # placements in parallel (the decode job is always picked up first)
+        decoded = self._executor.submit(self._decode, n, shot)
+        for key, task in self._plan.get(n, {}).items():
+            self._jobs[key] = self._executor.submit(self._transform, task, decoded)
+
+    def hasShots(self, num):
+        return all(key in self._jobs
+                   for n in range(num) for key in self._plan.get(n, {}))
+
+    def composePicture(self, shots):
         logging.info("Assembling picture")
 
         image = self._back.copy()
         for task in self._assemblytasks:
             logging.debug("assembly Task: %s", str(task))
-            task.do(image, pictures)
+            if isinstance(task, PhotoAssemblyTask):
+                task.paste(image, shots[task.key])
+            else:
+                task.do(image, None)
         
-        byte_data = BytesIO()
-        image.save(byte_data, format='jpeg')
-
-        image.thumbnail((self._cfg.getInt("Gallery", "size_x"), self._cfg.getInt("Gallery", "size_y"))) 
-
-        thumbnail_byte_data = BytesIO()
-        image.save(thumbnail_byte_data, format='jpeg')
-
-        return Picture(original=byte_data, thumbnail=thumbnail_byte_data, watermarked=byte_data)
+        return self.renderVariants(image)
 
 
 def testassemble(argv):
@@ -209,14 +328,11 @@ def testassemble(argv):
 
     #log = logging.getLogger(__name__)
     
-    import configparser
-    import os
+    from photobooth.Config import Config
 
     logging.debug(argv)
-    cfg = configparser.ConfigParser()
-    cfg.read_string("""[Template]
-     template = {}
-     """.format(argv.template))
+    cfg = Config('photobooth.cfg')
+    cfg.set('Template', 'template', argv.template)
 
     picsize = (3496,2362)
     ft = FancyTemplate(cfg)
@@ -236,8 +352,8 @@ def testassemble(argv):
         Image.new('RGB', picsize, "#AABBCC").save(byte_data, format='jpeg')
         photos.append(byte_data)
     
-    img_bytes = ft.assemblePicture(photos)
-    img = Image.open(img_bytes)
+    picture = ft.assemblePicture(photos)
+    img = Image.open(picture.original)
     if argv.out:
         img.save(argv.out)
     else:
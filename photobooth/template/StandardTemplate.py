@@ -9,7 +9,6 @@ from photobooth.worker.PictureList import Picture, ShotRef
 from . import Template
 
 from PIL import Image
-from io import BytesIO
 
 from .PictureDimensions import PictureDimensions
 
@@ -46,44 +45,41 @@ class StandardTemplate(Template):
             self._bg_template = Image.new('RGB', self._pic_dims.outputSize,
                                        (255, 255, 255))
             
+        # Overlays are cropped to their visible part to only blend what changes
         if len(self._foreground) > 0:
             logging.info('Using foreground "{}"'.format(self._foreground))
             fg_picture = Image.open(self._foreground)
-            self._fg_template = fg_picture.resize(self._pic_dims.outputSize)
+            self._fg_template = self.cropOverlay(
+                fg_picture.resize(self._pic_dims.outputSize))
 
         if len(self._watermark) > 0:
             logging.info('Using watermark "{}"'.format(self._watermark))
             wm_picture = Image.open(self._watermark)
-            self._wm_template = wm_picture.resize(self._pic_dims.outputSize)
+            self._wm_template = self.cropOverlay(
+                wm_picture.resize(self._pic_dims.outputSize))
 
 
-    def assemblePicture(self, pictures: list[ShotRef]):
+    def prepareShot(self, n: int, shot: ShotRef):
+
+        logging.debug('Preparing shot %d', n)
+
+        with self.metrics.stage('shot.wait'):
+            shot = self.waitShot(shot)
+        with self.metrics.stage('shot.decode'):
+            image = self.openShot(shot, self._pic_dims.thumbnailSize)
+            image.load()
+        with self.metrics.stage('shot.resize'):
+            return image.resize(self._pic_dims.thumbnailSize, Image.BICUBIC)
+
+    def composePicture(self, shots: dict):
 
         logging.info('Assembling picture')
 
         picture = self._bg_template.copy()
         for i in range(self.totalNumPics):
-            shot = Image.open(pictures[i])
-            resized = shot.resize(self._pic_dims.thumbnailSize, Image.BICUBIC)
-            picture.paste(resized, self._pic_dims.thumbnailOffset[i])
+            picture.paste(shots[i], self._pic_dims.thumbnailOffset[i])
 
         if self._fg_template: 
-            picture.paste(self._fg_template, mask=self._fg_template) 
-
-        byte_data = BytesIO()
-        picture.save(byte_data, format='jpeg')
-
-        thumbnail = picture.copy()
-        thumbnail.thumbnail(((self._cfg.getInt("Gallery", "size_x"), self._cfg.getInt("Gallery", "size_y")))) 
-
-        thumbnail_byte_data = BytesIO()
-        thumbnail.save(thumbnail_byte_data, format='jpeg')
-
-        watermarked = picture.copy()
-        if self._wm_template: 
-            watermarked.paste(self._wm_template, mask=self._wm_template) 
-
-        watermarked_byte_data = BytesIO()
-        watermarked.save(watermarked_byte_data, format='jpeg')
+            picture.paste(*self._fg_template)
 
-        return Picture(original=byte_data, thumbnail=thumbnail_byte_data, watermarked=watermarked_byte_data)
+        return self.renderVariants(picture, self._wm_template)
@@ -1,13 +1,22 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import os
+from concurrent.futures import Future, ThreadPoolExecutor
+from io import BytesIO
+from math import ceil
+
+from PIL import Image, ImageOps
+
 from photobooth.Config import Config
+from photobooth.Metrics import Metrics
 from photobooth.worker.PictureList import Picture, ShotRef
 
 # Available template modules as tuples of (config name, module name, class name)
 modules = (
     ('standard', 'StandardTemplate', 'StandardTemplate'),
-    ('fancy', 'FancyTemplate', 'FancyTemplate'))
+    ('fancy', 'FancyTemplate', 'FancyTemplate'),
+    ('burst', 'BurstTemplate', 'BurstTemplate'))
 
 
 class Template:
@@ -16,13 +25,158 @@ class Template:
 
         self._cfg = config
         self._totalNumPics = 0
+        self.metrics = Metrics()
+
+        # Shots are prepared in the background while the next one is taken,
+        # using all cores as Pillow releases the GIL while decoding/resampling
+        self._executor = ThreadPoolExecutor(max_workers=os.cpu_count())
+        self._jobs = {}
+
+        self._encoderOptions = {
+            variant: {
+                'quality': self._cfg.getInt('Picture', variant + '_quality'),
+                'progressive': self._cfg.getBool('Picture',
+                                                 variant + '_progressive'),
+                'optimize': self._cfg.getBool('Picture', variant + '_optimize')}
+            for variant in ('original', 'watermarked', 'thumbnail')}
 
     def startup(self):
         raise NotImplementedError('template function not implemented!')
 
-    def assemblePicture(self, pictures: list[ShotRef]) -> Picture:
+    @property
+    def burst(self):
+        ### Number of frames, interval and source if taking a burst, or None
+        return None
+
+    def prepareShot(self, n: int, shot: ShotRef):
+        ### Decode and transform shot n, runs in the background
+        raise NotImplementedError('template function not implemented!')
+
+    def composePicture(self, shots: dict) -> Picture:
+        ### Compose the prepared shots and encode the picture
         raise NotImplementedError('template function not implemented!')
 
+    def beginAssembly(self):
+
+        for job in self._jobs.values():
+            job.cancel()
+        self._jobs = {}
+
+    def addShot(self, n: int, shot: ShotRef or Future):
+
+        self._jobs[n] = self._executor.submit(self.prepareShot, n, shot)
+
+    def hasShots(self, num: int) -> bool:
+
+        # Shots are missing if the camera was restarted during a sequence
+        return all(n in self._jobs for n in range(num))
+
+    def finish(self) -> Picture:
+
+        with self.metrics.stage('assemble.wait'):
+            shots = {n: job.result() for n, job in self._jobs.items()}
+        self._jobs = {}
+        with self.metrics.stage('assemble.compose'):
+            return self.composePicture(shots)
+
+    def assemblePicture(self, pictures: list[ShotRef]) -> Picture:
+
+        self.beginAssembly()
+        for n, shot in enumerate(pictures):
+            self.addShot(n, shot)
+        return self.finish()
+
+    def encode(self, image: Image.Image, variant: str) -> BytesIO:
+
+        with self.metrics.stage('encode.' + variant):
+            byte_data = BytesIO()
+            image.save(byte_data, format='jpeg',
+                       **self._encoderOptions[variant])
+            return byte_data
+
+    def renderVariants(self, picture: Image.Image,
+                       watermark: tuple=None) -> Picture:
+        """
+        Encode all variants of the composed picture concurrently.
+        The thumbnail is resampled from an integer-reduced copy and the
+        watermarked variant shares the original if there is no watermark.
+        """
+        original = self._executor.submit(self.encode, picture, 'original')
+        thumbnail = self._executor.submit(self._renderThumbnail, picture)
+
+        if watermark is not None:
+            watermarked = self._executor.submit(self._renderWatermarked,
+                                                picture, watermark)
+            watermarked = watermarked.result()
+        else:
+            watermarked = None
+
+        original = original.result()
+        return Picture(original=original,
+                       watermarked=watermarked or original,
+                       thumbnail=thumbnail.result())
+
+    def _renderThumbnail(self, picture: Image.Image) -> BytesIO:
+
+        size = (self._cfg.getInt('Gallery', 'size_x'),
+                self._cfg.getInt('Gallery', 'size_y'))
+        factor = min(picture.size[i] // size[i] for i in range(2))
+        thumbnail = picture.reduce(factor) if factor > 1 else picture.copy()
+        thumbnail.thumbnail(size)
+        return self.encode(thumbnail, 'thumbnail')
+
+    def _renderWatermarked(self, picture: Image.Image,
+                           watermark: tuple) -> BytesIO:
+
+        watermarked = picture.copy()
+        watermarked.paste(*watermark)
+        return self.encode(watermarked, 'watermarked')
+
+    @staticmethod
+    def waitShot(shot: ShotRef or Future) -> ShotRef:
+
+        return shot.result() if isinstance(shot, Future) else shot
+
+    @staticmethod
+    def openShot(shot: ShotRef or Future,
+                 size: tuple[int, int]=None) -> Image.Image:
+        """
+        Open a shot for resampling it to cover the given size.
+        For JPEGs, the decoder downscales by 1/2, 1/4 or 1/8 in the DCT domain
+        while keeping the decoded image at least as large as needed.
+        The EXIF orientation of the shot is applied after decoding.
+        Shots still being downloaded are waited for.
+        """
+        image = Image.open(Template.waitShot(shot))
+        if size is not None:
+            # Orientations 5 to 8 swap width and height
+            if image.getexif().get(0x0112, 1) > 4:
+                size = size[::-1]
+            scale = max(size[i] / image.size[i] for i in range(2))
+            if scale < 1:
+                image.draft('RGB', tuple(ceil(image.size[i] * scale)
+                                         for i in range(2)))
+        return ImageOps.exif_transpose(image)
+
+    @staticmethod
+    def cropOverlay(overlay: Image.Image) -> tuple:
+        """
+        Crop an RGBA overlay to its non-transparent bounding box.
+        Returns the cropped overlay, its offset and the mask to paste it
+        with (None if opaque) or None if the overlay is fully transparent.
+        The overlay keeps straight alpha, which paste blends onto the opaque
+        picture in a single pass.
+        """
+        overlay = overlay.convert('RGBA')
+        alpha = overlay.getchannel('A')
+        bbox = alpha.getbbox()
+        if bbox is None:
+            return None
+
+        overlay = overlay.crop(bbox)
+        mask = overlay if alpha.crop(bbox).getextrema()[0] < 255 else None
+        return overlay, bbox[:2], mask
+
     @property
     def totalNumPics(self):
         ### Number of pictures to be taken
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Photobooth - a flexible photo booth software
+# Copyright (C) 2023  <photobooth-lausanne at gmail dot com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+from flask import Flask, render_template, send_file
+from threading import Thread
+from time import time
+
+from ..worker.PictureList import PictureList
+
+app = Flask(__name__)
+
+index_data = None
+
+picture_list = None
+
+
+def start(host: str, port: int, pictureList: PictureList, data: dict):
+    global index_data, picture_list
+
+    picture_list = pictureList
+    index_data = data
+
+    Thread(target=lambda: app.run(host=host, port=port, debug=False),
+           daemon=True).start()
+
+
+@app.route('/')
+def index():
+    logging.info('GET index page')
+    picture_list.findExistingFiles()
+    index_data['count'] = picture_list.count()
+    return render_template('index.html', **index_data)
+
+@app.route('/slideshow')
+def slideshow():
+    logging.info('GET slideshow page')
+    picture_list.findExistingFiles()
+    index_data['r'] = time()
+    return render_template('slideshow.html', **index_data)
+
+@app.route('/thumbnail/<int:index>')
+def thumbnail(index):
+    pictureRef = picture_list.getPicture(index)
+    logging.info(f'GET picture thumbnail { index }: { pictureRef.thumbnail }')
+    # For local paths, we need to go back to the cwd it has been based on, otherwise, just use the global path
+    return send_file(pictureRef.thumbnail if pictureRef.thumbnail.startswith('/') else f'../../{ pictureRef.thumbnail }')
+
+@app.route('/r')
+def rpicture():
+    pictureRef, _ = picture_list.getRandomPicture()
+    logging.info(f'GET random picture: { pictureRef.watermarked }')
+    # For local paths, we need to go back to the cwd it has been based on, otherwise, just use the global path
+    return send_file(pictureRef.watermarked if pictureRef.watermarked.startswith('/') else f'../../{ pictureRef.watermarked }')
+
+@app.route('/<int:index>')
+def picture(index):
+    pictureRef = picture_list.getPicture(index)
+    logging.info(f'GET picture { index }: { pictureRef.watermarked }')
+    # For local paths, we need to go back to the cwd it has been based on, otherwise, just use the global path
+    return send_file(pictureRef.watermarked if pictureRef.watermarked.startswith('/') else f'../../{ pictureRef.watermarked }')
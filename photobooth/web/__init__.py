@@ -18,22 +18,14 @@
 # along with this program. If not, see <http://www.gnu.org/licenses/>.
 
 import logging
-from flask import Flask, request, render_template, send_file
 import os.path
-from time import localtime, strftime, time
+from time import localtime, strftime
 
 from photobooth.Config import Config
 
 from ..worker.PictureList import PictureList
 from .. import StateMachine
 from ..Threading import Communicator, Workers
-from threading import Thread
-
-app = Flask(__name__)
-
-index_data = None
-
-picture_list = None
 
 class Web:    
     def __init__(self, config: Config, comm: Communicator):
@@ -55,23 +47,22 @@ class Web:
         self.initWeb(config)
 
     def initWeb(self, config: Config):
-        global index_data, picture_list
 
         if self._is_enabled_server:
 
+            # Flask is only imported when the server is enabled
+            from . import Server
+
             port = config.getInt('Web', 'port')
             host = config.get('Web', 'host')
 
-            picture_list = self._pictureList
-
             index_data = {
                 "name": config.get('Event', 'event'),
                 "link": config.get('Web', 'link'),
                 "count": self._pictureList.count(),
             }
 
-            
-            Thread(target=lambda: app.run(host=host, port=port, debug=False), daemon=True).start()
+            Server.start(host, port, self._pictureList, index_data)
             logging.info(f'Web server enabled (http://{ host }:{ port })')
         else:
             logging.info('Web server disabled')
@@ -90,42 +81,7 @@ class Web:
 
     def teardown(self, state: StateMachine.State):
 
-        func = request.environ.get('werkzeug.server.shutdown')
-        if func is None:
-            raise RuntimeError('Not running with the Werkzeug Server')
-        func()
-
-@app.route('/')
-def index():
-    logging.info('GET index page')
-    picture_list.findExistingFiles()
-    index_data['count'] = picture_list.count()
-    return render_template('index.html', **index_data)
-
-@app.route('/slideshow')
-def slideshow():
-    logging.info('GET slideshow page')
-    picture_list.findExistingFiles()
-    index_data['r'] = time()
-    return render_template('slideshow.html', **index_data)
-
-@app.route('/thumbnail/<int:index>')
-def thumbnail(index):
-    pictureRef = picture_list.getPicture(index)
-    logging.info(f'GET picture thumbnail { index }: { pictureRef.thumbnail }')
-    # For local paths, we need to go back to the cwd it has been based on, otherwise, just use the global path
-    return send_file(pictureRef.thumbnail if pictureRef.thumbnail.startswith('/') else f'../../{ pictureRef.thumbnail }')
-
-@app.route('/r')
-def rpicture():
-    pictureRef, _ = picture_list.getRandomPicture()
-    logging.info(f'GET random picture: { pictureRef.watermarked }')
-    # For local paths, we need to go back to the cwd it has been based on, otherwise, just use the global path
-    return send_file(pictureRef.watermarked if pictureRef.watermarked.startswith('/') else f'../../{ pictureRef.watermarked }')
-
-@app.route('/<int:index>')
-def picture(index):
-    pictureRef = picture_list.getPicture(index)
-    logging.info(f'GET picture { index }: { pictureRef.watermarked }')
-    # For local paths, we need to go back to the cwd it has been based on, otherwise, just use the global path
-    return send_file(pictureRef.watermarked if pictureRef.watermarked.startswith('/') else f'../../{ pictureRef.watermarked }')
+        # The server runs in a daemon thread which ends with the process,
+        # shutting it down via the request environment is only possible
+        # from within a request
+        logging.info('Web server stopping')
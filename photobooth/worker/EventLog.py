@@ -23,14 +23,13 @@ from time import localtime, strftime
 from datetime import datetime
 
 from photobooth.Config import Config
-from photobooth.StateMachine import Event
 
 from .WorkerTask import WorkerTask
 
 
 class EventLog(WorkerTask):
 
-    def __init__(self, config: Config, event: Event):
+    def __init__(self, config: Config, event: str):
 
         super().__init__()
 
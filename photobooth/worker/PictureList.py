@@ -35,11 +35,15 @@ class Picture(NamedTuple):
     original: PictureData
     watermarked: PictureData
     thumbnail: PictureData
+    animation: PictureData = None
+    clip: PictureData = None
 
 class PictureRef(NamedTuple):
     original: str
     watermarked: str
     thumbnail: str
+    animation: str = None
+    clip: str = None
 
 
 class PictureList:
@@ -128,6 +132,14 @@ class PictureList:
         """Return the watermarked name for a given file number"""
         return self.basename + str(count).zfill(self.count_width) + ".watermark" + self.suffix
 
+    def getAnimation(self, count: int):
+        """Return the animated GIF name for a given file number"""
+        return self.basename + str(count).zfill(self.count_width) + ".gif"
+
+    def getClip(self, count: int):
+        """Return the animated WebP name for a given file number"""
+        return self.basename + str(count).zfill(self.count_width) + ".webp"
+
     def getFilenameShot(self, count: str, shotCount: str):
         """Return the file name for a given shot & file number"""
         return self.getFilename(count+1)[:-len(self.suffix)] + \
@@ -156,7 +168,8 @@ class PictureList:
 
     def getPicture(self, count: str):
         """Return the picture for a given file number"""
-        return PictureRef(self.getFilename(count), self.getWatermarked(count), self.getThumbnail(count))
+        return PictureRef(self.getFilename(count), self.getWatermarked(count), self.getThumbnail(count),
+                          self.getAnimation(count), self.getClip(count))
 
     def getNextPicture(self, picture: PictureRef):
         """Return the next filename or None if not available"""
@@ -44,3 +44,13 @@ class PictureSaver(PictureWorkerTask):
         logging.info('Saving picture thumbnail as %s', pictureRef.thumbnail)
         with open(pictureRef.thumbnail, 'wb') as f:
             f.write(picture.thumbnail.getbuffer())
+
+        if picture.animation is not None:
+            logging.info('Saving animation as %s', pictureRef.animation)
+            with open(pictureRef.animation, 'wb') as f:
+                f.write(picture.animation.getbuffer())
+
+        if picture.clip is not None:
+            logging.info('Saving clip as %s', pictureRef.clip)
+            with open(pictureRef.clip, 'wb') as f:
+                f.write(picture.clip.getbuffer())
@@ -29,13 +29,9 @@ from ..Threading import Communicator, Workers
 
 from .AdList import AdList
 from .PictureList import Picture, PictureList, PictureRef, Shot, ShotRef
-from .PictureMailer import PictureMailer
 from .PictureSaver import PictureSaver
 from .ShotSaver import ShotSaver
-from .PictureUploadS3 import PictureUploadS3
-from .PictureUploadWebdav import PictureUploadWebdav
 from .Counter import Counter
-from .PostprocessorPrinter import PostprocessorPrinter
 from .EventLog import EventLog
 
 
@@ -78,16 +74,22 @@ class Worker:
         # PictureSaver for assembled pictures
         self._reviewPictureTasks.append(PictureSaver())
 
+        # Optional tasks are imported only when enabled, as their
+        # dependencies are slow to import
+
         # PictureMailer for assembled pictures
         if config.getBool('Mailer', 'enable'):
+            from .PictureMailer import PictureMailer
             self._reviewPictureTasks.append(PictureMailer(config))
 
         # PictureUploadS3 to upload pictures to a s3 storage for direct download
         if config.getBool('UploadS3', 'enable'):
+            from .PictureUploadS3 import PictureUploadS3
             self._reviewPictureTasks.append(PictureUploadS3(config))
 
         # PictureUploadWebdav to upload pictures to a webdav storage
         if config.getBool('UploadWebdav', 'enable'):
+            from .PictureUploadWebdav import PictureUploadWebdav
             self._reviewPictureTasks.append(PictureUploadWebdav(config))
 
     def initPostprocessTasks(self, config: Config):
@@ -97,6 +99,7 @@ class Worker:
 
         # Check print configurations
         if config.getBool('Printer', 'enable'):
+            from .PostprocessorPrinter import PostprocessorPrinter
             module = config.get('Printer', 'module')
             paper_size = (config.getInt('Printer', 'width'),
                           config.getInt('Printer', 'height'))
@@ -141,7 +144,11 @@ class Worker:
             self.teardown(state)
         elif isinstance(state, StateMachine.ReviewState):
             pictureRef = self._pictureList.getNewPicture()
-            self.doReviewPictureTasks(state.picture, pictureRef)
+            try:
+                picture = self._comm.blobs.loadEach(state.picture)
+                self.doReviewPictureTasks(picture, pictureRef)
+            finally:
+                self._comm.blobs.release(state.picture)
         elif isinstance(state, StateMachine.PostprocessState) or isinstance(state, StateMachine.GallerySelectState):
             if not state.action:
                 self.doPostprocessAutomTasks(state.pictureRef)
@@ -150,7 +157,10 @@ class Worker:
         elif isinstance(state, StateMachine.CameraEvent):
             if state.name == 'capture':
                 shotRef = self._pictureList.getNextPictureShot()
-                self.doShotTasks(state.shot, shotRef)
+                try:
+                    self.doShotTasks(self._comm.blobs.load(state.shot), shotRef)
+                finally:
+                    self._comm.blobs.release(state.shot)
             else:
                 raise ValueError('Unknown CameraEvent "{}"'.format(state))
 
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Photobooth - a flexible photo booth software
+# Copyright (C) 2023  <photobooth-lausanne at gmail dot com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import io
+import os
+import sys
+
+import pytest
+from PIL import Image
+
+from photobooth.camera.CameraGphoto2Shell import CameraGphoto2Shell
+
+# Stand-in for `gphoto2 --shell`: answers every command with the output of
+# gphoto2 followed by its prompt, and saves a copy of the given JPEG to the
+# working directory for captures. With --fail, captures report an error.
+fake_shell = r'''
+import shutil
+import sys
+
+prompt = 'gphoto2: {/store_00010001} /> '
+frame, fail = sys.argv[1], '--fail' in sys.argv
+
+sys.stdout.write(prompt)
+sys.stdout.flush()
+count = 0
+for line in sys.stdin:
+    command = line.strip()
+    if command == 'exit':
+        break
+    sys.stdout.write(command + '\n')
+    if command in ('capture-preview', 'capture-image-and-download'):
+        if fail:
+            sys.stdout.write('*** Error (-53: Could not claim the USB device) ***\n')
+        else:
+            count += 1
+            name = 'capt{:04d}.jpg'.format(count)
+            shutil.copy(frame, name)
+            sys.stdout.write('New file is in location /capt0000.jpg on the camera\n')
+            sys.stdout.write('Saving file as {}\n'.format(name))
+    elif command == 'get-config cameramodel':
+        sys.stdout.write('Label: Camera Model\nType: TEXT\nCurrent: Fake EOS\nEND\n')
+    else:
+        sys.stdout.write('*** Error (-2: Bad parameters) ***\n')
+    sys.stdout.write(prompt)
+    sys.stdout.flush()
+'''
+
+frame_size = (64, 48)
+
+
+@pytest.fixture
+def command(tmp_path):
+
+    script = tmp_path / 'gphoto2.py'
+    script.write_text(fake_shell)
+    frame = tmp_path / 'frame.jpg'
+    Image.new('RGB', frame_size, 'red').save(frame, format='jpeg')
+    return (sys.executable, str(script), str(frame))
+
+
+@pytest.fixture
+def camera(command):
+
+    cap = CameraGphoto2Shell(command=command, timeout=5)
+    yield cap
+    cap.cleanup()
+
+
+def test_preview(camera):
+
+    preview = camera.getPreview()
+    assert preview.size == frame_size
+
+
+def test_picture(camera):
+
+    data = camera.getPictureBytes()
+    assert data.getvalue()[:2] == b'\xff\xd8'
+    assert Image.open(io.BytesIO(data.getvalue())).size == frame_size
+
+    assert camera.getPicture().size == frame_size
+
+    # Downloaded files are removed from the working directory
+    assert os.listdir(camera._tmp_dir) == []
+
+
+def test_probe(camera):
+
+    assert camera.probe() == 'Fake EOS'
+
+
+def test_error(command):
+
+    cap = CameraGphoto2Shell(command=command + ('--fail', ), timeout=5)
+    try:
+        with pytest.raises(RuntimeError, match='Could not claim'):
+            cap.getPictureBytes()
+
+        # The shell is still usable after a failed command
+        assert cap.probe() == 'Fake EOS'
+    finally:
+        cap.cleanup()
+
+
+def test_restart(camera):
+
+    camera.getPreview()
+    camera._shell.kill()
+    camera._shell.wait()
+
+    assert camera.getPreview().size == frame_size
+    assert camera.getPictureBytes().getvalue()[:2] == b'\xff\xd8'